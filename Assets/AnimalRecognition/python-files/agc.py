@@ -0,0 +1,70 @@
+"""
+Streaming gain control for the capture path.
+
+The model wants each window peak-normalized. Instead of scanning the whole 44032-sample
+window for its peak on every inference (most of it was scanned last time), the peak of
+each incoming block is computed once as it arrives, in 10ms chunks, and a monotonic deque
+keeps the sliding-window maximum over the chunks the window covers. Each queued window carries the
+gain that was current when it was cut, and the model input is scaled by it directly,
+skipping the full-window scan. The window itself stays raw, because the cascade features
+and the capture log rely on its absolute level.
+
+The gain is capped (see audio_preprocessing.DEFAULT_MAX_GAIN) so quiet rooms don't turn
+background hiss into full-scale input.
+"""
+
+from collections import deque
+
+import numpy as np
+
+from audio_preprocessing import DEFAULT_MAX_GAIN, SAMPLE_RATE, normalization_gain
+
+CHUNK_SIZE = SAMPLE_RATE // 100
+
+
+def chunk_peaks(block, chunk_size=CHUNK_SIZE):
+    """Peak absolute amplitude of each chunk of a block, without allocating np.abs(block)"""
+    starts = np.arange(0, len(block), chunk_size)
+    return np.maximum(np.maximum.reduceat(block, starts), -np.minimum.reduceat(block, starts)), starts
+
+
+class StreamingGainControl:
+    def __init__(self, window_size, max_gain=DEFAULT_MAX_GAIN, chunk_size=CHUNK_SIZE):
+        self.window_size = window_size
+        self.max_gain = max_gain
+        self.chunk_size = chunk_size
+        # (end sample, peak) per chunk, peaks strictly decreasing from left to right
+        self.peaks = deque()
+        self.samples = 0
+
+    def update(self, block):
+        """Account for a block that was just appended to the audio buffer"""
+        if not len(block):
+            return
+        peaks, starts = chunk_peaks(block, self.chunk_size)
+        ends = self.samples + np.append(starts[1:], len(block))
+        self.samples += len(block)
+
+        for end, peak in zip(ends.tolist(), peaks.tolist()):
+            # A louder chunk makes every older, quieter chunk irrelevant for the window max
+            while self.peaks and self.peaks[-1][1] <= peak:
+                self.peaks.pop()
+            self.peaks.append((end, peak))
+
+        # Drop chunks that lie entirely before the window. A chunk straddling the window
+        # start still counts, so the peak can only be overestimated, never clipped
+        window_start = self.samples - self.window_size
+        while self.peaks[0][0] <= window_start:
+            self.peaks.popleft()
+
+    def peak(self):
+        """Peak amplitude over the last window_size samples"""
+        return self.peaks[0][1] if self.peaks else 0.0
+
+    def gain(self):
+        """Normalization gain for the current window"""
+        return normalization_gain(self.peak(), self.max_gain)
+
+    def reset(self):
+        self.peaks.clear()
+        self.samples = 0
@@ -1,4 +1,3 @@
-import socket
 import sounddevice as sd
 import numpy as np
 import tensorflow as tf
@@ -7,9 +6,23 @@ import librosa
 import os
 import threading
 import queue
+import argparse
 
 from collections import deque, Counter
 from dotenv import load_dotenv
+from hot_reload import HotReloader, load_config_file, warm_up_interpreter
+from profiler import NullProfiler, add_profile_arguments, create_profiler
+from capture_log import CaptureWriter
+from audio_preprocessing import SAMPLE_RATE, EXPECTED_INPUT_SIZE, DEFAULT_MAX_GAIN, prepare_model_input
+from agc import StreamingGainControl
+from resampler import StreamingResampler
+from cascade import Cascade, CheapClassifier
+from speculative import SpeculativeDetector
+from shadow_evaluation import ShadowEvaluator
+from transports import create_transport
+from cpu_tuning import ThreadTuner
+from capture_ring import SampleRing
+from event_journal import DETECTION, MAJORITY, PROVISIONAL, CONFIRMED, RETRACTED, create_journal
 
 load_dotenv()
 # ---- CONFIG ----
@@ -17,8 +30,8 @@ MODEL_PATH = os.getenv("MODEL_PATH", "../soundclassifier_with_metadata.tflite")
 LABELS_PATH = os.getenv("LABELS_PATH", "../labels.txt")
 UDP_IP = os.getenv("UDP_IP", "127.0.0.1")
 UDP_PORT = int(os.getenv("UDP_PORT", "5005"))
-SAMPLE_RATE = 16000
-EXPECTED_INPUT_SIZE = 44032
+# Where results go: udp://host:port (default), unix:///path.sock or shm://name
+RESULT_TRANSPORT = os.getenv("RESULT_TRANSPORT", f"udp://{UDP_IP}:{UDP_PORT}")
 DURATION = EXPECTED_INPUT_SIZE / SAMPLE_RATE  # Calculate duration to match expected input size
 VAD_MODE = 2  # 0-3, higher = more aggressive
 CONFIDENCE_THRESHOLD = 0.8 # Lowered for testing - minimum confidence for classification
@@ -28,37 +41,140 @@ PROCESS_INTERVAL = 0.5  # Process audio every 0.5 seconds
 OBSERVATION_WINDOW_DURATION = 5.0  # Time window for observations (seconds)
 MAJORITY_THRESHOLD = 0.6  # Minimum percentage for majority (60%)
 MAJORITY_CHECK_INTERVAL = 5.0  # Check for majority every 5 seconds
+# Capture at the device's native rate (0 = device default) and resample to SAMPLE_RATE
+CAPTURE_SAMPLE_RATE = int(os.getenv("CAPTURE_SAMPLE_RATE", "0"))
+CAPTURE_CHANNELS = int(os.getenv("CAPTURE_CHANNELS", "1"))
+# Lock-free handoff from the audio callback: raw device audio ring, model-rate audio ring
+CAPTURE_RING_SECONDS = float(os.getenv("CAPTURE_RING_SECONDS", "2.0"))
+AUDIO_RING_SECONDS = float(os.getenv("AUDIO_RING_SECONDS", "10.0"))
+INGEST_POLL_INTERVAL = 0.01  # Seconds the ingest thread sleeps when the capture ring is empty
+# Streaming gain control: track the window peak per block instead of scanning every window
+AGC = os.getenv("AGC", "1") == "1"
+AGC_MAX_GAIN = float(os.getenv("AGC_MAX_GAIN", str(DEFAULT_MAX_GAIN)))  # 0 = uncapped
+# Cheap pre-classifier that skips the full model on obvious background (empty = disabled)
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", "")
+CASCADE_AUDIT_RATE = float(os.getenv("CASCADE_AUDIT_RATE", "0.05"))
+# Candidate model evaluated in the shadow of the live one (empty = disabled)
+CANDIDATE_MODEL_PATH = os.getenv("CANDIDATE_MODEL_PATH", "")
+CANDIDATE_LABELS_PATH = os.getenv("CANDIDATE_LABELS_PATH", LABELS_PATH)
+# Speculative early detection on partial windows after a sound onset
+SPECULATIVE = os.getenv("SPECULATIVE", "0") == "1"
+SPECULATIVE_INTERVAL = float(os.getenv("SPECULATIVE_INTERVAL", "0.25"))  # Seconds between partial windows
+SPECULATIVE_MAX_SECONDS = float(os.getenv("SPECULATIVE_MAX_SECONDS", "1.5"))  # Longest partial window
+ONSET_RATIO = float(os.getenv("ONSET_RATIO", "4.0"))  # Level jump over the noise floor that counts as onset
+# CPU tuning; per-thread affinity and capture priority are read by cpu_tuning.ThreadTuner.from_env
+INTERPRETER_THREADS = int(os.getenv("INTERPRETER_THREADS", "0"))  # 0 = TFLite default
+WARM_UP = os.getenv("WARM_UP", "1") == "1"
+# Hot reload settings
+CONFIG_PATH = os.getenv("CONFIG_PATH", "recognizer_config.json")
+HOT_RELOAD = os.getenv("HOT_RELOAD", "1") == "1"
+HOT_RELOAD_POLL_INTERVAL = float(os.getenv("HOT_RELOAD_POLL_INTERVAL", "1.0"))
+# Capture log of classified windows for replay and retraining (empty = disabled)
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "")
+CAPTURE_MAX_WINDOWS = int(os.getenv("CAPTURE_MAX_WINDOWS", "5000"))
+# Append-only journal of detection events (empty = disabled)
+EVENT_JOURNAL_DIR = os.getenv("EVENT_JOURNAL_DIR", "")
+# Settings that the config file may override without a restart
+RUNTIME_CONFIG_KEYS = (
+    "confidence_threshold",
+    "process_interval",
+    "detection_cooldown",
+    "observation_window_duration",
+    "majority_threshold",
+    "majority_check_interval",
+    "majority_cooldown",
+)
 # ----------------
 
 class AudioRecognitionServer:
-    def __init__(self):
+    def __init__(self, profiler=None):
+        self.profiler = profiler or NullProfiler()
+        self.tuner = ThreadTuner.from_env()
         self.labels = self.load_labels()
         self.interpreter = self.load_model()
+        # Held while the interpreter runs so a hot reload swaps it between inferences
+        self.model_lock = threading.Lock()
+
+        # Tunables that can be changed at runtime through the config file
+        self.confidence_threshold = CONFIDENCE_THRESHOLD
+        self.process_interval = PROCESS_INTERVAL
+        self.observation_window_duration = OBSERVATION_WINDOW_DURATION
+        self.majority_threshold = MAJORITY_THRESHOLD
+        self.majority_check_interval = MAJORITY_CHECK_INTERVAL
 
         self.audio_queue = queue.Queue()
         self.is_running = False
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.transport = create_transport(RESULT_TRANSPORT)
         
         # Audio processing buffers
         buffer_size = int(SAMPLE_RATE * DURATION)
         print(f"Buffer configuration: SAMPLE_RATE={SAMPLE_RATE}, DURATION={DURATION:.3f}s, Buffer size={buffer_size}, Expected input={EXPECTED_INPUT_SIZE}")
-        self.audio_buffer = deque(maxlen=buffer_size)
-        self.last_process_time = time.time()
+        # Model-rate audio written by the ingest thread; queued windows are (start, end) sample
+        # positions in it, and its `written` count is the total number of samples received
+        self.audio_ring = SampleRing(max(int(SAMPLE_RATE * AUDIO_RING_SECONDS), buffer_size))
+        # Created in start_server once the device's native rate is known
+        self.capture_ring = None
+        self.resampler = StreamingResampler(SAMPLE_RATE, SAMPLE_RATE, 1)
+        self.agc = StreamingGainControl(buffer_size, AGC_MAX_GAIN) if AGC else None
+        # Written only by the audio callback
+        self.overflows = 0
+        self.lost_samples = 0
+        self.stale_windows = 0
+        self.speculation = None
+        if SPECULATIVE:
+            self.speculation = SpeculativeDetector(SAMPLE_RATE, interval=SPECULATIVE_INTERVAL,
+                                                   max_seconds=SPECULATIVE_MAX_SECONDS, onset_ratio=ONSET_RATIO)
+        self.last_window_end = 0
         self.last_detection_time = 0
         self.detection_cooldown = 0.5  # Minimum time between detections (half the input length)
         
-        # Observation collection for majority voting
+        # Observation collection for majority voting, shared by the processing and majority
+        # threads; the lock also covers last_detection_time and the majority send state
+        self.observation_lock = threading.Lock()
         self.observations = deque()
         self.observation_timestamps = deque()
         self.last_majority_check_time = 0
         self.last_majority_send_time = 0
         self.majority_cooldown = 2.0  # Minimum time between majority sends (seconds)
         self.last_sent_majority = None
+
+        # Apply the config file on startup so the reloader only has to track changes
+        self.apply_config(load_config_file(CONFIG_PATH))
+        self.capture_log = None
+        if CAPTURE_PATH:
+            try:
+                self.capture_log = CaptureWriter(CAPTURE_PATH, self.labels, SAMPLE_RATE, EXPECTED_INPUT_SIZE,
+                                                 max_windows=CAPTURE_MAX_WINDOWS)
+            except Exception as e:
+                print(f"Error opening capture log: {e}")
+
+        self.cascade = None
+        if CASCADE_MODEL_PATH:
+            try:
+                self.cascade = Cascade(CheapClassifier.load(CASCADE_MODEL_PATH), audit_rate=CASCADE_AUDIT_RATE)
+                print(f"Cascade pre-classifier loaded from {CASCADE_MODEL_PATH}")
+            except Exception as e:
+                print(f"Error loading cascade pre-classifier: {e}")
+
+        self.journal = create_journal(EVENT_JOURNAL_DIR, "recognizer")
+
+        self.shadow = None
+        if CANDIDATE_MODEL_PATH:
+            try:
+                self.shadow = ShadowEvaluator(CANDIDATE_MODEL_PATH, self.load_labels(CANDIDATE_LABELS_PATH),
+                                              max_gain=AGC_MAX_GAIN)
+            except Exception as e:
+                print(f"Error loading candidate model for shadow evaluation: {e}")
+
+        self.reloader = None
+        if HOT_RELOAD:
+            self.reloader = HotReloader(self, MODEL_PATH, LABELS_PATH, CONFIG_PATH,
+                                        poll_interval=HOT_RELOAD_POLL_INTERVAL)
         
-    def load_labels(self):
+    def load_labels(self, labels_path=LABELS_PATH):
         """Load classification labels from file"""
         try:
-            with open(LABELS_PATH, "r") as f:
+            with open(labels_path, "r") as f:
                 labels = [line.strip().split(maxsplit=1)[1] for line in f.readlines()]
             print(f"Loaded {len(labels)} labels: {labels}")
             return labels
@@ -66,44 +182,41 @@ class AudioRecognitionServer:
             print(f"Error loading labels: {e}")
             return ["Background Noise", "Cat", "Chicken", "Cow", "Frog", "Mouse", "Seagull"]
     
-    def load_model(self):
+    def load_model(self, model_path=MODEL_PATH):
         """Load TensorFlow Lite model"""
         try:
-            interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
+            interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=INTERPRETER_THREADS or None)
             interpreter.allocate_tensors()
-            print(f"Model loaded successfully from {MODEL_PATH}")
+            print(f"Model loaded successfully from {model_path}")
             return interpreter
         except Exception as e:
             print(f"Error loading model: {e}")
             return None
+
+    def swap_model(self, interpreter, labels):
+        """Replace the interpreter and labels between two inferences"""
+        with self.model_lock:
+            self.interpreter = interpreter
+            self.labels = labels
+        print(f"🔄 Swapped in new model ({len(labels)} labels: {labels})")
+
+    def apply_config(self, config):
+        """Apply runtime tunables from a config dictionary"""
+        for key, value in config.items():
+            if key not in RUNTIME_CONFIG_KEYS:
+                print(f"Ignoring unknown config key: {key}")
+                continue
+            try:
+                setattr(self, key, float(value))
+                print(f"Config: {key} = {float(value)}")
+            except (TypeError, ValueError):
+                print(f"Ignoring invalid value for {key}: {value!r}")
     
-    def preprocess_audio(self, audio_data):
+    def preprocess_audio(self, audio_data, gain=None):
         """Preprocess audio data for model input"""
         try:
             #print(f"Preprocessing: input length {len(audio_data)}, expected {EXPECTED_INPUT_SIZE}")
-            
-            # Ensure audio is the right length
-            if len(audio_data) < EXPECTED_INPUT_SIZE:
-                # Pad with zeros if too short
-                #print(f"Padding audio from {len(audio_data)} to {EXPECTED_INPUT_SIZE}")
-                audio_data = np.pad(audio_data, (0, EXPECTED_INPUT_SIZE - len(audio_data)))
-            elif len(audio_data) > EXPECTED_INPUT_SIZE:
-                # Truncate if too long
-                #print(f"Truncating audio from {len(audio_data)} to {EXPECTED_INPUT_SIZE}")
-                audio_data = audio_data[:EXPECTED_INPUT_SIZE]
-            
-            #print(f"Length after adjustment: {len(audio_data)}")
-            
-            # Normalize audio
-            audio_data = audio_data.astype(np.float32)
-            max_amplitude = np.max(np.abs(audio_data))
-            #print(f"Max amplitude before normalization: {max_amplitude}")
-            
-            if max_amplitude > 0:
-                audio_data = audio_data / max_amplitude
-                #print(f"Normalized, new max amplitude: {np.max(np.abs(audio_data))}")
-            #else:
-                #print("Zero amplitude audio, skipping normalization")
+            audio_data = prepare_model_input(audio_data, EXPECTED_INPUT_SIZE, AGC_MAX_GAIN, gain)
             
             # Reshape for model input
             audio_data = audio_data.reshape(1, -1)
@@ -118,17 +231,28 @@ class AudioRecognitionServer:
     
     def classify_audio(self, audio_data):
         """Run inference on audio data"""
+        label, confidence, _ = self.classify_audio_with_probabilities(audio_data)
+        return label, confidence
+
+    def classify_audio_with_probabilities(self, audio_data, gain=None):
+        """Run inference and also return the full probability vector"""
+        with self.model_lock:
+            return self._classify_locked(audio_data, gain)
+
+    def _classify_locked(self, audio_data, gain=None):
+        """Run inference with the model lock held"""
         if self.interpreter is None:
             print("✗ Interpreter is None, cannot classify")
-            return None, 0.0
+            return None, 0.0, None
         
         try:
             #print(f"Preprocessing audio: {len(audio_data)} samples")
             # Preprocess audio
-            processed_audio = self.preprocess_audio(audio_data)
+            with self.profiler.stage("preprocess"):
+                processed_audio = self.preprocess_audio(audio_data, gain)
             if processed_audio is None:
                 print("✗ Preprocessing failed")
-                return None, 0.0
+                return None, 0.0, None
             
             #print(f"Preprocessed audio shape: {processed_audio.shape}")
             
@@ -139,15 +263,16 @@ class AudioRecognitionServer:
             #print(f"Input details: {input_details[0]}")
             #print(f"Output details: {output_details[0]}")
             
-            # Set input tensor
-            self.interpreter.set_tensor(input_details[0]['index'], processed_audio)
-            
-            # Run inference
-            #print("Running inference...")
-            self.interpreter.invoke()
-            
-            # Get output
-            output_data = self.interpreter.get_tensor(output_details[0]['index'])
+            with self.profiler.stage("inference"):
+                # Set input tensor
+                self.interpreter.set_tensor(input_details[0]['index'], processed_audio)
+                
+                # Run inference
+                #print("Running inference...")
+                self.interpreter.invoke()
+                
+                # Get output
+                output_data = self.interpreter.get_tensor(output_details[0]['index'])
             probabilities = output_data[0]
             
             #print(f"Raw probabilities: {probabilities}")
@@ -158,19 +283,34 @@ class AudioRecognitionServer:
             
             #print(f"Best index: {best_idx}, Confidence: {confidence:.3f}")
             
-            if confidence >= CONFIDENCE_THRESHOLD:
+            if confidence >= self.confidence_threshold:
                 predicted_label = self.labels[best_idx] if best_idx < len(self.labels) else f"Unknown_{best_idx}"
                 #print(f"✓ High confidence prediction: {predicted_label}")
-                return predicted_label, confidence
+                return predicted_label, confidence, probabilities
             else:
                 #print(f"✗ Low confidence, returning Background Noise")
-                return "Background Noise", confidence
+                return "Background Noise", confidence, probabilities
                 
         except Exception as e:
             print(f"Error during classification: {e}")
             import traceback
             traceback.print_exc()
-            return None, 0.0
+            return None, 0.0, None
+    
+    def classify_window(self, audio_data, gain=None):
+        """Classify a window, skipping the full model when the cascade is sure it's background"""
+        if self.cascade is None:
+            return self.classify_audio_with_probabilities(audio_data, gain)
+
+        with self.profiler.stage("cascade"):
+            decision = self.cascade.decide(audio_data)
+        if decision.skip:
+            return "Background Noise", 1.0 - decision.animal_probability, None
+
+        label, confidence, probabilities = self.classify_audio_with_probabilities(audio_data, gain)
+        if label:
+            self.cascade.record_full_result(decision, label != "Background Noise")
+        return label, confidence, probabilities
     
     def add_observation(self, label, confidence, timestamp):
         """Add a new observation to the collection"""
@@ -187,7 +327,7 @@ class AudioRecognitionServer:
     
     def clean_old_observations(self, current_time):
         """Remove observations older than the time window"""
-        while self.observation_timestamps and (current_time - self.observation_timestamps[0]) > OBSERVATION_WINDOW_DURATION:
+        while self.observation_timestamps and (current_time - self.observation_timestamps[0]) > self.observation_window_duration:
             self.observation_timestamps.popleft()
             self.observations.popleft()
             print("Removed old observation due to time window")
@@ -209,10 +349,10 @@ class AudioRecognitionServer:
         print(f"Most common: {most_common_class} ({count}/{total_observations} = {majority_percentage:.1%})")
         
         # Check if we have a clear majority
-        if majority_percentage >= MAJORITY_THRESHOLD:
+        if majority_percentage >= self.majority_threshold:
             return most_common_class, majority_percentage
         else:
-            print(f"No clear majority (need {MAJORITY_THRESHOLD:.1%}, got {majority_percentage:.1%})")
+            print(f"No clear majority (need {self.majority_threshold:.1%}, got {majority_percentage:.1%})")
             return None, majority_percentage
     
     def send_majority_via_udp(self, majority_class, majority_percentage):
@@ -229,10 +369,11 @@ class AudioRecognitionServer:
             print(f"⏳ Skipping majority send - same as last sent: {majority_class}")
             return
         
-        # Send result via UDP
-        message = f"{majority_class},{majority_percentage:.3f}".encode()
-        print(f"🎯 Sending MAJORITY via UDP: {message.decode()} to {UDP_IP}:{UDP_PORT}")
-        self.socket.sendto(message, (UDP_IP, UDP_PORT))
+        # Send result via the configured transport (UDP by default)
+        message = f"{majority_class},{majority_percentage:.3f}"
+        print(f"🎯 Sending MAJORITY: {message} to {RESULT_TRANSPORT}")
+        self.send_message(message)
+        self.journal.append(majority_class, majority_percentage, MAJORITY)
         
         self.last_majority_send_time = current_time
         self.last_sent_majority = majority_class
@@ -245,28 +386,30 @@ class AudioRecognitionServer:
     def check_majority_periodically(self):
         """Check for majority class every 5 seconds"""
         print("Majority checking thread started")
+        self.tuner.tune("majority")
         while self.is_running:
             try:
                 current_time = time.time()
                 
                 # Check if it's time to check for majority
-                if current_time - self.last_majority_check_time >= MAJORITY_CHECK_INTERVAL:
-                    print(f"\n⏰ Time to check majority (every {MAJORITY_CHECK_INTERVAL}s)")
+                if current_time - self.last_majority_check_time >= self.majority_check_interval:
+                    with self.profiler.stage("majority"), self.observation_lock:
+                        print(f"\n⏰ Time to check majority (every {self.majority_check_interval}s)")
                     
-                    # Clean old observations first
-                    self.clean_old_observations(current_time)
+                        # Clean old observations first
+                        self.clean_old_observations(current_time)
                     
-                    # Check if we have any observations
-                    if self.observations:
-                        majority_class, majority_percentage = self.get_majority_class()
-                        if majority_class:
-                            self.send_majority_via_udp(majority_class, majority_percentage)
+                        # Check if we have any observations
+                        if self.observations:
+                            majority_class, majority_percentage = self.get_majority_class()
+                            if majority_class:
+                                self.send_majority_via_udp(majority_class, majority_percentage)
+                            else:
+                                print("No clear majority found in current window")
                         else:
-                            print("No clear majority found in current window")
-                    else:
-                        print("No observations in current window")
+                            print("No observations in current window")
                     
-                    self.last_majority_check_time = current_time
+                        self.last_majority_check_time = current_time
                 
                 # Sleep for a short time before next check
                 time.sleep(0.1)
@@ -277,68 +420,124 @@ class AudioRecognitionServer:
                 traceback.print_exc()
     
     def audio_callback(self, indata, frames, time_info, status):
-        """Callback for audio input"""
-        #print(f"Audio input received: {frames} frames, shape: {indata.shape}, max amplitude: {np.max(np.abs(indata)):.4f}")
-        
-        if status:
-            print(f"Audio callback status: {status}")
-        
-        # Convert to mono if stereo
-        if indata.ndim > 1:
-            audio_data = np.mean(indata, axis=1)
-        else:
-            audio_data = indata.flatten()
+        """Callback for audio input; runs on PortAudio's real-time thread"""
+        self.profiler.name_thread("callback")
+        self.tuner.tune("callback")
+        with self.profiler.stage("callback"):
+            if status and status.input_overflow:
+                self.overflows += 1
+            # A copy into preallocated memory and a counter bump: no locks, no allocation, no I/O
+            self.capture_ring.write(indata)
+
+    def ingest_audio(self):
+        """Move captured audio from the capture ring into the model-rate ring"""
+        print("Ingest thread started")
+        self.tuner.tune("ingest")
+        block = np.empty((self.capture_ring.capacity // 4, self.capture_ring.buffer.shape[1]), dtype=np.float32)
+        position = self.capture_ring.written
+        reported_overflows = 0
+        while self.is_running:
+            try:
+                if self.overflows != reported_overflows:
+                    print(f"Audio input overflow ({self.overflows - reported_overflows} new)")
+                    reported_overflows = self.overflows
+                
+                samples, position, lost = self.capture_ring.read_from(position, block)
+                if lost:
+                    self.lost_samples += lost
+                    print(f"✗ Ingest fell behind, {lost} captured samples overwritten")
+                if not len(samples):
+                    time.sleep(INGEST_POLL_INTERVAL)
+                    continue
+                with self.profiler.stage("ingest"):
+                    self.buffer_audio(samples)
+            except Exception as e:
+                print(f"Error ingesting audio: {e}")
+                import traceback
+                traceback.print_exc()
+
+    def buffer_audio(self, block):
+        """Add captured audio to the model-rate ring and queue windows for processing"""
+        # Downmix to mono and resample from the device rate to SAMPLE_RATE
+        audio_data = self.resampler.process(block)
         
         # Add to buffer
-        self.audio_buffer.extend(audio_data)
-        #print(f"Buffer size after adding: {len(self.audio_buffer)}")
+        self.audio_ring.write(audio_data)
+        samples_received = self.audio_ring.written
+        if self.agc:
+            self.agc.update(audio_data)
         
-        # Check if we should process the audio buffer
-        current_time = time.time()
-        if current_time - self.last_process_time >= PROCESS_INTERVAL:
-            #print(f"Time to process! Buffer size: {len(self.audio_buffer)}, Expected: {EXPECTED_INPUT_SIZE}")
-            # Get the current buffer content
-            if len(self.audio_buffer) >= EXPECTED_INPUT_SIZE:
-                # Convert deque to numpy array
-                buffer_array = np.array(list(self.audio_buffer))
-                # Put in queue for processing
-                self.audio_queue.put(buffer_array.copy())
-                self.last_process_time = current_time
-                #print(f"✓ Added to processing queue: {len(buffer_array)} samples, max amplitude: {np.max(np.abs(buffer_array)):.4f}")
-            #else:
-                #print(f"✗ Buffer too small: {len(self.audio_buffer)} < {EXPECTED_INPUT_SIZE}")
-        else:
-            time_until_process = PROCESS_INTERVAL - (current_time - self.last_process_time)
-            #print(f"Waiting {time_until_process:.2f}s until next processing")
+        # Queue a partial window right away if a sound just started
+        if self.speculation:
+            partial_length = self.speculation.on_block(audio_data, samples_received)
+            if partial_length:
+                start = max(0, samples_received - partial_length)
+                self.audio_queue.put((start, samples_received, self.speculation.partial_onset, None))
+        
+        # Queue a full window every process_interval worth of audio
+        if samples_received - self.last_window_end >= self.process_interval * SAMPLE_RATE \
+                and samples_received >= EXPECTED_INPUT_SIZE:
+            # Queued with the gain the window's peak calls for
+            gain = self.agc.gain() if self.agc else None
+            self.audio_queue.put((samples_received - EXPECTED_INPUT_SIZE, samples_received, None, gain))
+            self.last_window_end = samples_received
     
     def process_audio_queue(self):
         """Process audio from queue"""
         print("Processing thread started")
+        self.tuner.tune("processing")
         while self.is_running:
             try:
-                # Get audio data from queue with timeout
-                audio_data = self.audio_queue.get(timeout=0.1)
-                #print(f"✓ Retrieved audio from queue: {len(audio_data)} samples")
+                # Get the next window's position from the queue with timeout
+                window_start, window_end, onset_sample, gain = self.audio_queue.get(timeout=0.1)
+                audio_data = self.audio_ring.read(window_start, window_end)
+                if audio_data is None:
+                    # Processing stalled so long the ring has moved past this window
+                    self.stale_windows += 1
+                    continue
+                
+                if onset_sample is not None:
+                    self.process_partial_window(audio_data, onset_sample)
+                    continue
+                
+                # A window that settles a provisional result is never skipped
+                confirming = self.speculation is not None and self.speculation.is_confirm_window(window_end)
                 
                 # Check cooldown to avoid spam
                 current_time = time.time()
-                if current_time - self.last_detection_time < self.detection_cooldown:
+                with self.observation_lock:
+                    cooling_down = current_time - self.last_detection_time < self.detection_cooldown
+                if not confirming and cooling_down:
                     #print(f"⏳ Skipping due to cooldown ({self.detection_cooldown - (current_time - self.last_detection_time):.1f}s remaining)")
                     continue
                 
                 # Classify audio
                 #print("Running classification...")
-                label, confidence = self.classify_audio(audio_data)
+                classify_start = time.perf_counter()
+                label, confidence, probabilities = self.classify_window(audio_data, gain)
+                classify_latency = time.perf_counter() - classify_start
                 #print(f"Classification result: {label} (confidence: {confidence:.3f})")
                 
+                if self.capture_log and probabilities is not None:
+                    self.capture_log.append(audio_data, current_time, probabilities, self.labels)
+                
+                # Only shadow windows the full model ran on, and only when no live work is waiting
+                if self.shadow and label and probabilities is not None and self.audio_queue.empty():
+                    self.shadow.submit(audio_data, gain, label, classify_latency, self.confidence_threshold)
+                
+                if confirming and label:
+                    self.resolve_provisional(label, confidence)
+                
                 if label:
-                    # Add observation to collection
-                    self.add_observation(label, confidence, current_time)
-                    
-                    # Clean old observations
-                    self.clean_old_observations(current_time)
+                    self.journal.append(label, confidence, DETECTION, classify_latency, timestamp=current_time)
+                    with self.profiler.stage("voting"), self.observation_lock:
+                        # Add observation to collection
+                        self.add_observation(label, confidence, current_time)
+                        
+                        # Clean old observations
+                        self.clean_old_observations(current_time)
                     
-                    self.last_detection_time = current_time
+                        self.last_detection_time = current_time
                 #else:
                     #print(f"Classification failed")
                 
@@ -350,34 +549,111 @@ class AudioRecognitionServer:
                 import traceback
                 traceback.print_exc()
     
+    def configure_capture(self):
+        """Pick the capture rate and channel count and set up the resampler and capture ring"""
+        capture_rate = CAPTURE_SAMPLE_RATE
+        channels = CAPTURE_CHANNELS
+        try:
+            device_info = sd.query_devices(kind='input')
+            if not capture_rate:
+                capture_rate = int(device_info['default_samplerate'])
+            channels = max(1, min(channels, int(device_info['max_input_channels'])))
+        except Exception as e:
+            print(f"Could not query input device ({e}), capturing at {SAMPLE_RATE}Hz")
+            capture_rate = capture_rate or SAMPLE_RATE
+        self.resampler = StreamingResampler(capture_rate, SAMPLE_RATE, channels)
+        self.capture_ring = SampleRing(int(capture_rate * CAPTURE_RING_SECONDS), channels)
+        return capture_rate, channels
+    
+    def process_partial_window(self, audio_data, onset_sample):
+        """Classify a partial window and publish an early provisional result"""
+        with self.profiler.stage("speculative"):
+            label, confidence, _ = self.classify_audio_with_probabilities(audio_data)
+        if not label or label == "Background Noise":
+            return
+        publish, superseded = self.speculation.accept_provisional(onset_sample, label, confidence)
+        if superseded:
+            # A new sound started before the last one's full window; don't leave it dangling
+            print(f"✗ New onset before confirmation, retracting provisional {superseded}")
+            self.send_message(f"{superseded},0.000,retracted")
+            self.journal.append(superseded, 0.0, RETRACTED)
+        if publish:
+            print(f"⚡ Provisional {label} ({confidence:.3f}) from {len(audio_data) / SAMPLE_RATE:.2f}s of audio")
+            self.send_message(f"{label},{confidence:.3f},provisional")
+            self.journal.append(label, confidence, PROVISIONAL)
+    
+    def resolve_provisional(self, label, confidence):
+        """Confirm or retract the provisional result using a full window"""
+        provisional_label, confirmed = self.speculation.resolve(label)
+        if confirmed:
+            print(f"✓ Full window confirmed provisional {provisional_label}")
+            self.send_message(f"{provisional_label},{confidence:.3f},confirmed")
+            self.journal.append(provisional_label, confidence, CONFIRMED)
+        else:
+            print(f"✗ Full window says {label}, retracting provisional {provisional_label}")
+            self.send_message(f"{provisional_label},0.000,retracted")
+            self.journal.append(provisional_label, 0.0, RETRACTED)
+    
+    def send_message(self, message):
+        """Send a text message to the game over the result transport"""
+        try:
+            if not self.transport.send(message.encode()):
+                print(f"✗ Message dropped by {RESULT_TRANSPORT}: {message}")
+        except Exception as e:
+            print(f"Error sending message: {e}")
+    
     def start_server(self):
         """Start the audio recognition server"""
         if self.interpreter is None:
             print("Error: Model not loaded. Cannot start server.")
             return
         
+        if WARM_UP:
+            with self.model_lock:
+                warm_up_interpreter(self.interpreter)
+        
         self.is_running = True
+        self.profiler.start()
         
         # Start audio processing thread
-        processing_thread = threading.Thread(target=self.process_audio_queue)
+        processing_thread = threading.Thread(target=self.process_audio_queue, name="processing")
         processing_thread.daemon = True
         processing_thread.start()
         
         # Start majority checking thread
-        majority_thread = threading.Thread(target=self.check_majority_periodically)
+        majority_thread = threading.Thread(target=self.check_majority_periodically, name="majority")
         majority_thread.daemon = True
         majority_thread.start()
+
+        if self.reloader:
+            self.reloader.start()
+        if self.shadow:
+            self.shadow.start()
         
         print(f"Starting audio recognition server...")
-        print(f"Listening on microphone at {SAMPLE_RATE}Hz")
-        print(f"UDP output: {UDP_IP}:{UDP_PORT}")
-        print(f"Confidence threshold: {CONFIDENCE_THRESHOLD}")
-        print(f"Processing interval: {PROCESS_INTERVAL}s")
+        capture_rate, channels = self.configure_capture()
+        
+        # Start the thread that moves audio from the callback's ring to the model-rate ring
+        ingest_thread = threading.Thread(target=self.ingest_audio, name="ingest")
+        ingest_thread.daemon = True
+        ingest_thread.start()
+        
+        print(f"Listening on microphone at {capture_rate}Hz, {channels} channel(s)")
+        if capture_rate != SAMPLE_RATE or channels > 1:
+            print(f"Resampling to {SAMPLE_RATE}Hz mono")
+        print(f"Result output: {RESULT_TRANSPORT}")
+        print(f"CPU tuning: {INTERPRETER_THREADS or 'default'} interpreter threads, {self.tuner.describe()}")
+        print(f"Confidence threshold: {self.confidence_threshold}")
+        print(f"Processing interval: {self.process_interval}s")
         print(f"Detection cooldown: {self.detection_cooldown}s")
-        print(f"Observation window duration: {OBSERVATION_WINDOW_DURATION}s")
-        print(f"Majority threshold: {MAJORITY_THRESHOLD:.1%}")
-        print(f"Majority check interval: {MAJORITY_CHECK_INTERVAL}s")
+        print(f"Observation window duration: {self.observation_window_duration}s")
+        print(f"Majority threshold: {self.majority_threshold:.1%}")
+        print(f"Majority check interval: {self.majority_check_interval}s")
         print(f"Majority cooldown: {self.majority_cooldown}s")
+        if self.speculation:
+            print(f"Speculative detection: partial windows every {SPECULATIVE_INTERVAL}s up to {SPECULATIVE_MAX_SECONDS}s after onset")
+        if self.reloader:
+            print(f"Hot reload: watching {MODEL_PATH}, {LABELS_PATH}, {CONFIG_PATH}")
         print("Press Ctrl+C to stop")
         
         try:
@@ -385,9 +661,9 @@ class AudioRecognitionServer:
             # Start audio stream with larger blocksize for better performance
             with sd.InputStream(
                 callback=self.audio_callback,
-                channels=1,
-                samplerate=SAMPLE_RATE,
-                blocksize=int(SAMPLE_RATE * 0.1)  # 100ms blocks
+                channels=channels,
+                samplerate=capture_rate,
+                blocksize=int(capture_rate * 0.1)  # 100ms blocks
             ):
                 print("Audio stream started successfully!")
                 while self.is_running:
@@ -403,13 +679,34 @@ class AudioRecognitionServer:
     def stop_server(self):
         """Stop the audio recognition server"""
         self.is_running = False
-        self.socket.close()
+        if self.reloader:
+            self.reloader.stop()
+        self.profiler.stop()
+        if self.capture_log:
+            self.capture_log.close()
+        if self.cascade:
+            print(self.cascade.report())
+        if self.shadow:
+            self.shadow.stop()
+            print(self.shadow.report())
+        self.transport.close()
+        self.journal.close()
+        if self.overflows:
+            print(f"Input overflows during the session: {self.overflows}")
+        if self.lost_samples or self.stale_windows:
+            print(f"Captured samples lost: {self.lost_samples}, stale windows skipped: {self.stale_windows}")
         print("Server stopped.")
 
 def main():
     """Main function to run the audio recognition server"""
-    server = AudioRecognitionServer()
+    parser = argparse.ArgumentParser(description="Animal sound recognition server")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    profiler = create_profiler(args)
+    server = AudioRecognitionServer(profiler=profiler)
     server.start_server()
+    profiler.write_report(args.profile_output, args.profile_top)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,43 @@
+"""
+Model input preprocessing shared by the live recognizer and offline tools.
+
+Anything that feeds the sound classifier should go through `prepare_model_input` so
+offline evaluation sees exactly what the live path sees.
+"""
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+EXPECTED_INPUT_SIZE = 44032
+# Cap on the normalization gain (26dB) so quiet rooms don't turn hiss into full-scale input
+DEFAULT_MAX_GAIN = 20.0
+
+
+def normalization_gain(peak, max_gain=DEFAULT_MAX_GAIN):
+    """Gain that brings `peak` to full scale, capped at `max_gain` (None = uncapped)"""
+    if peak <= 0:
+        return 1.0
+    gain = 1.0 / peak
+    return min(gain, max_gain) if max_gain else gain
+
+
+def prepare_model_input(audio_data, expected_size=EXPECTED_INPUT_SIZE, max_gain=DEFAULT_MAX_GAIN, gain=None):
+    """Pad/truncate to the model window and peak-normalize, returning a float32 1-D array
+
+    Pass the `gain` tracked by the streaming gain control to skip the full-window peak scan.
+    """
+    # Ensure audio is the right length
+    if len(audio_data) < expected_size:
+        # Pad with zeros if too short
+        audio_data = np.pad(audio_data, (0, expected_size - len(audio_data)))
+    elif len(audio_data) > expected_size:
+        # Truncate if too long
+        audio_data = audio_data[:expected_size]
+
+    # Normalize audio
+    audio_data = np.asarray(audio_data, dtype=np.float32)
+    if gain is None:
+        gain = normalization_gain(float(np.max(np.abs(audio_data))), max_gain)
+    audio_data = audio_data * np.float32(gain)
+
+    return audio_data
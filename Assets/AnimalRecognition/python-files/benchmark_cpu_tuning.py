@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Sweep CPU tuning settings on the kiosk hardware and report latency and xruns (Linux).
+
+Each configuration runs the recognizer's capture -> ingest -> processing pipeline for a
+fixed time: a capture callback copying 100ms blocks into the capture ring, an ingest
+thread resampling them into the model-rate ring and queueing a window every
+PROCESS_INTERVAL, and a processing thread running the real TFLite model on it. Optional
+busy processes stand in for Unity competing for the CPU.
+
+    python benchmark_cpu_tuning.py --threads 1 2 4 --priorities 0 70 --load 2
+    python benchmark_cpu_tuning.py --layouts none "callback=3;ingest=3;processing=0-2" --synthetic
+
+With --synthetic a timer thread replaces the microphone and a block delivered more than
+one block late counts as an xrun; otherwise xruns are PortAudio input overflows. "lost"
+counts captured samples the ingest thread didn't get to before the capture ring wrapped.
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from audio_preprocessing import EXPECTED_INPUT_SIZE, SAMPLE_RATE, prepare_model_input
+from capture_ring import SampleRing
+from cpu_tuning import ROLES, ThreadTuner, format_cpu_list, parse_cpu_list
+from hot_reload import warm_up_interpreter
+from resampler import StreamingResampler
+
+BLOCK_SIZE = int(SAMPLE_RATE * 0.1)
+# Ring sizes and ingest polling as in animal-recognizer.py
+CAPTURE_RING_SECONDS = 2.0
+AUDIO_RING_SECONDS = 10.0
+INGEST_POLL_INTERVAL = 0.01
+
+
+def parse_layout(text, all_cpus):
+    """Parse "callback=3;processing=0-2" into a role -> CPU set mapping; "none" pins nothing"""
+    # Unpinned roles get every core explicitly, so a reused thread doesn't keep an old mask
+    affinity = {role: set(all_cpus) for role in ROLES}
+    if text == "none":
+        return affinity
+    for part in text.split(";"):
+        role, _, cpus = part.partition("=")
+        role = role.strip()
+        if role not in ROLES:
+            raise ValueError(f"Unknown role '{role}' in layout '{text}'")
+        affinity[role] = parse_cpu_list(cpus)
+    return affinity
+
+
+def default_layouts(all_cpus):
+    """No pinning, plus the capture side on its own core when there are enough cores"""
+    cpus = sorted(all_cpus)
+    layouts = ["none"]
+    if len(cpus) >= 2:
+        layouts.append(f"callback={cpus[-1]};ingest={cpus[-1]};majority={cpus[-1]};"
+                       f"processing={format_cpu_list(cpus[:-1])}")
+    return layouts
+
+
+def burn():
+    while True:
+        pass
+
+
+class PipelineRun:
+    def __init__(self, model_path, num_threads, tuner, process_interval, warm_up):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        if warm_up:
+            warm_up_interpreter(self.interpreter)
+        self.tuner = tuner
+        self.process_interval = process_interval
+        self.capture_ring = SampleRing(int(SAMPLE_RATE * CAPTURE_RING_SECONDS), 1)
+        self.audio_ring = SampleRing(int(SAMPLE_RATE * AUDIO_RING_SECONDS))
+        self.resampler = StreamingResampler(SAMPLE_RATE, SAMPLE_RATE, 1)
+        self.queue = queue.Queue()
+        self.last_window_end = 0
+        # perf_counter time of the latest callback, for end-to-end latency
+        self.last_block_time = 0.0
+        self.xruns = 0
+        self.lost_samples = 0
+        self.stale_windows = 0
+        self.callback_times = []
+        self.inference_latencies = []
+        self.end_to_end_latencies = []
+        self.is_running = False
+
+    def on_block(self, block, overflow):
+        self.tuner.tune("callback")
+        start = time.perf_counter()
+        if overflow:
+            self.xruns += 1
+        self.capture_ring.write(block)
+        self.last_block_time = start
+        self.callback_times.append(time.perf_counter() - start)
+
+    def ingest(self):
+        self.tuner.tune("ingest")
+        block = np.empty((self.capture_ring.capacity // 4, 1), dtype=np.float32)
+        position = 0
+        while self.is_running:
+            samples, position, lost = self.capture_ring.read_from(position, block)
+            self.lost_samples += lost
+            if not len(samples):
+                time.sleep(INGEST_POLL_INTERVAL)
+                continue
+            captured_at = self.last_block_time
+            self.audio_ring.write(self.resampler.process(samples))
+            written = self.audio_ring.written
+            if written - self.last_window_end >= self.process_interval * SAMPLE_RATE and written >= EXPECTED_INPUT_SIZE:
+                self.queue.put((written - EXPECTED_INPUT_SIZE, written, captured_at))
+                self.last_window_end = written
+
+    def process(self):
+        self.tuner.tune("processing")
+        input_details = self.interpreter.get_input_details()[0]
+        output_details = self.interpreter.get_output_details()[0]
+        while self.is_running:
+            try:
+                window_start, window_end, captured_at = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            window = self.audio_ring.read(window_start, window_end)
+            if window is None:
+                self.stale_windows += 1
+                continue
+            start = time.perf_counter()
+            self.interpreter.set_tensor(input_details['index'], prepare_model_input(window).reshape(1, -1))
+            self.interpreter.invoke()
+            self.interpreter.get_tensor(output_details['index'])
+            done = time.perf_counter()
+            self.inference_latencies.append(done - start)
+            self.end_to_end_latencies.append(done - captured_at)
+
+    def synthetic_capture(self, duration):
+        """Deliver noise blocks on a 100ms clock and count blocks that arrive a block late"""
+        self.tuner.tune("callback")
+        rng = np.random.default_rng(0)
+        block_time = BLOCK_SIZE / SAMPLE_RATE
+        start = time.perf_counter()
+        for index in itertools.count():
+            deadline = start + (index + 1) * block_time
+            if deadline - start > duration:
+                break
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            late = time.perf_counter() - deadline > block_time
+            self.on_block(rng.normal(0, 0.05, (BLOCK_SIZE, 1)).astype(np.float32), late)
+
+    def microphone_capture(self, duration):
+        import sounddevice as sd
+
+        def callback(indata, frames, time_info, status):
+            self.on_block(indata, status.input_overflow)
+
+        with sd.InputStream(callback=callback, channels=1, samplerate=SAMPLE_RATE, blocksize=BLOCK_SIZE):
+            time.sleep(duration)
+
+    def run(self, duration, synthetic):
+        self.is_running = True
+        worker_threads = [threading.Thread(target=self.ingest, name="ingest"),
+                          threading.Thread(target=self.process, name="processing")]
+        for thread in worker_threads:
+            thread.start()
+        try:
+            if synthetic:
+                capture_thread = threading.Thread(target=self.synthetic_capture, args=(duration,), name="callback")
+                capture_thread.start()
+                capture_thread.join()
+            else:
+                self.microphone_capture(duration)
+        finally:
+            self.is_running = False
+            for thread in worker_threads:
+                thread.join()
+
+
+def percentile_ms(values, q):
+    return np.percentile(values, q) * 1000 if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark interpreter threads, core pinning and capture priority")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "../soundclassifier_with_metadata.tflite"))
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 1, 2, 4],
+                        help="Interpreter thread counts to try (0 = TFLite default)")
+    parser.add_argument("--layouts", nargs="+", default=None,
+                        help='Affinity layouts, "none" or "callback=3;ingest=3;processing=0-2;majority=0"')
+    parser.add_argument("--priorities", type=int, nargs="+", default=[0, 70],
+                        help="SCHED_FIFO priorities for the capture thread (0 = normal scheduling)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per configuration")
+    parser.add_argument("--process-interval", type=float, default=0.5)
+    parser.add_argument("--load", type=int, default=0, help="Busy processes competing for the CPU")
+    parser.add_argument("--no-warm-up", action="store_true", help="Skip the warm-up inference")
+    parser.add_argument("--synthetic", action="store_true", help="Use a timer instead of the microphone")
+    args = parser.parse_args()
+
+    all_cpus = os.sched_getaffinity(0)
+    layouts = args.layouts or default_layouts(all_cpus)
+    burners = [multiprocessing.Process(target=burn, daemon=True) for _ in range(args.load)]
+    for burner in burners:
+        burner.start()
+
+    print(f"{len(all_cpus)} CPUs available, {args.load} busy processes, {args.duration:.0f}s per configuration")
+    print(f"{'threads':>7} {'prio':>4}  {'layout':<52} {'infer p50':>9} {'p95':>7} {'e2e p95':>8} "
+          f"{'e2e max':>8} {'cb max':>7} {'windows':>7} {'xruns':>5} {'lost':>6}")
+    try:
+        for num_threads, layout, priority in itertools.product(args.threads, layouts, args.priorities):
+            tuner = ThreadTuner(parse_layout(layout, all_cpus), priority)
+            run = PipelineRun(args.model, num_threads, tuner, args.process_interval, not args.no_warm_up)
+            run.run(args.duration, args.synthetic)
+            print(f"{num_threads or 'dflt':>7} {priority:>4}  {layout:<52} "
+                  f"{percentile_ms(run.inference_latencies, 50):>8.1f}ms {percentile_ms(run.inference_latencies, 95):>5.1f}ms "
+                  f"{percentile_ms(run.end_to_end_latencies, 95):>6.1f}ms {percentile_ms(run.end_to_end_latencies, 100):>6.1f}ms "
+                  f"{percentile_ms(run.callback_times, 100):>5.2f}ms {len(run.inference_latencies):>7} {run.xruns:>5} {run.lost_samples:>6}")
+    finally:
+        for burner in burners:
+            burner.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Latency and throughput benchmark for the result transports (Linux).
+
+For each transport a receiver runs in a separate process, like Unity or a gateway would.
+The latency phase sends paced messages carrying their send time on CLOCK_MONOTONIC and
+the receiver reports one-way latency percentiles. The throughput phase sends a burst as
+fast as possible and reports delivered messages per second and drops.
+
+    python benchmark_transports.py --messages 5000
+"""
+
+import argparse
+import multiprocessing
+import os
+import struct
+import time
+
+import numpy as np
+
+from transports import create_receiver, create_transport
+
+TIMESTAMP = struct.Struct("<Qq")
+# Same size as a typical "Seagull,0.934" result plus the timestamp header
+PADDING = b"Seagull,0.934"
+
+
+def now_ns():
+    return time.clock_gettime_ns(time.CLOCK_MONOTONIC)
+
+
+def receive(url, expected, ready, results):
+    """Receiver process: collect one-way latencies until `expected` messages or a quiet second"""
+    receiver = create_receiver(url)
+    ready.set()
+    latencies = np.zeros(expected, dtype=np.int64)
+    received = 0
+    first = last = None
+    while received < expected:
+        payload = receiver.recv(timeout=1.0)
+        if payload is None:
+            break
+        arrived = now_ns()
+        sequence, sent = TIMESTAMP.unpack_from(payload)
+        if sequence == 2 ** 64 - 1:
+            # End-of-run marker
+            break
+        latencies[received] = arrived - sent
+        received += 1
+        first = first or arrived
+        last = arrived
+    receiver.close()
+    results.put((latencies[:received].tolist(), received, (last or 0) - (first or 0)))
+
+
+def run_phase(url, messages, interval):
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=receive, args=(url, messages, ready, results))
+    process.start()
+    ready.wait(timeout=5.0)
+    time.sleep(0.05)
+
+    transport = create_transport(url)
+    sent = 0
+    dropped = 0
+    start = now_ns()
+    for sequence in range(messages):
+        if interval:
+            # Busy-wait pacing; sleep() granularity would dominate the latency numbers
+            target = start + int(sequence * interval * 1e9)
+            while now_ns() < target:
+                pass
+        payload = TIMESTAMP.pack(sequence, now_ns()) + PADDING
+        if transport.send(payload):
+            sent += 1
+        else:
+            dropped += 1
+    send_time = (now_ns() - start) / 1e9
+    time.sleep(0.2)
+    transport.send(TIMESTAMP.pack(2 ** 64 - 1, 0))
+
+    latencies, received, receive_span = results.get(timeout=10.0)
+    process.join(timeout=5.0)
+    transport.close()
+    return np.asarray(latencies) / 1000.0, sent, dropped, received, send_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare result transports")
+    parser.add_argument("--messages", type=int, default=5000, help="Messages per phase")
+    parser.add_argument("--interval", type=float, default=0.001, help="Seconds between paced messages")
+    parser.add_argument("--transports", nargs="+",
+                        default=["udp://127.0.0.1:5999", f"unix:///tmp/animorphosis-bench-{os.getpid()}.sock",
+                                 f"shm://animorphosis-bench-{os.getpid()}"])
+    args = parser.parse_args()
+
+    print(f"{'Transport':<14} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'burst msg/s':>12} {'delivered':>10} {'dropped':>8}")
+    for url in args.transports:
+        latencies, _, _, _, _ = run_phase(url, args.messages, args.interval)
+        _, sent, dropped, received, send_time = run_phase(url, args.messages, 0)
+        name = url.split("://")[0]
+        if len(latencies):
+            p50, p99, worst = np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max()
+        else:
+            p50 = p99 = worst = float("nan")
+        print(f"{name:<14} {p50:>8.1f} {p99:>8.1f} {worst:>8.1f} {sent / max(send_time, 1e-9):>12.0f} "
+              f"{received:>10} {dropped + sent - received:>8}")
+
+
+if __name__ == "__main__":
+    main()
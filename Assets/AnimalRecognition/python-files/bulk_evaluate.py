@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Bulk evaluation of a sound classifier over a directory of labelled clips.
+
+Clips are expected in one sub-directory per class, named like the entries in labels.txt:
+
+    clips/
+        Cow/moo_001.wav
+        Cat/meow_017.flac
+        Background Noise/room_3.wav
+
+Decoding and batched inference run in a pool of worker processes, each with its own
+TFLite interpreter. Every clip goes through the same `prepare_model_input` as the live
+recognizer. Results are appended to a checkpoint file as they arrive, so an interrupted
+run picks up where it stopped when started again with the same --checkpoint. Clips that
+failed to decode or classify are logged there too but retried on the next run.
+
+    python bulk_evaluate.py clips/ --model ../soundclassifier_with_metadata_latest.tflite
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from audio_preprocessing import SAMPLE_RATE, EXPECTED_INPUT_SIZE, prepare_model_input
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".mp3", ".m4a", ".aiff", ".aif"}
+# Matches CONFIDENCE_THRESHOLD in animal-recognizer.py
+DEFAULT_CONFIDENCE_THRESHOLD = 0.8
+BACKGROUND_LABEL = "Background Noise"
+
+
+def load_labels(labels_path):
+    """Load labels from a Teachable Machine labels.txt ("0 Background Noise" per line)"""
+    with open(labels_path, "r") as f:
+        return [line.strip().split(maxsplit=1)[1] for line in f if line.strip()]
+
+
+def find_clips(root, labels):
+    """Yield (path, label index) for every audio file under a class directory"""
+    label_index = {label.lower(): i for i, label in enumerate(labels)}
+    for class_dir in sorted(os.listdir(root)):
+        class_path = os.path.join(root, class_dir)
+        if not os.path.isdir(class_path):
+            continue
+        if class_dir.lower() not in label_index:
+            print(f"Skipping directory '{class_dir}': not a label in the model")
+            continue
+        true_index = label_index[class_dir.lower()]
+        for dirpath, _, filenames in os.walk(class_path):
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() in AUDIO_EXTENSIONS:
+                    yield os.path.join(dirpath, filename), true_index
+
+
+def load_checkpoint(checkpoint_path):
+    """Load results already computed by a previous (possibly interrupted) run
+
+    Failed clips are left out so they are retried.
+    """
+    results = {}
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return results
+    with open(checkpoint_path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted run may be partial
+                continue
+            if "error" in result:
+                continue
+            results[result["path"]] = result
+    return results
+
+
+# ---- Worker process ----
+_interpreter = None
+_batch_size = 1
+# Why the worker has no interpreter; every clip it is given is reported with this error
+_init_error = None
+
+
+def init_worker(model_path, batch_size, num_threads):
+    """Create one interpreter per worker, resized for batched inference if the model allows it
+
+    Never raises: a failing pool initializer makes multiprocessing respawn workers forever.
+    """
+    global _interpreter, _batch_size, _init_error
+    try:
+        import tensorflow as tf
+
+        _interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        input_index = _interpreter.get_input_details()[0]['index']
+        _batch_size = batch_size
+        if batch_size > 1:
+            try:
+                # Fixed-batch models often accept the resize and only fail to allocate
+                _interpreter.resize_tensor_input(input_index, [batch_size, EXPECTED_INPUT_SIZE])
+                _interpreter.allocate_tensors()
+                return
+            except Exception:
+                _batch_size = 1
+                _interpreter.resize_tensor_input(input_index, [1, EXPECTED_INPUT_SIZE])
+        _interpreter.allocate_tensors()
+    except Exception as e:
+        _interpreter = None
+        _init_error = f"Worker could not load the model: {e}"
+
+
+def decode_clip(path):
+    """Decode a clip to 16 kHz mono float32"""
+    import librosa
+    audio_data, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+    return audio_data
+
+
+def evaluate_batch(batch):
+    """Decode and classify a list of (path, true index); returns result dicts"""
+    if _interpreter is None:
+        return [{"path": path, "true": true_index, "error": _init_error} for path, true_index in batch], 0.0, 0.0
+    input_details = _interpreter.get_input_details()[0]
+    output_details = _interpreter.get_output_details()[0]
+
+    results = []
+    inputs = []
+    decode_start = time.perf_counter()
+    for path, true_index in batch:
+        try:
+            audio_data = decode_clip(path)
+        except Exception as e:
+            results.append({"path": path, "true": true_index, "error": str(e)})
+            continue
+        inputs.append((path, true_index, len(audio_data) / SAMPLE_RATE, prepare_model_input(audio_data)))
+    decode_time = time.perf_counter() - decode_start
+
+    inference_start = time.perf_counter()
+    for start in range(0, len(inputs), _batch_size):
+        chunk = inputs[start:start + _batch_size]
+        batch_input = np.zeros((_batch_size, EXPECTED_INPUT_SIZE), dtype=np.float32)
+        for row, (_, _, _, model_input) in enumerate(chunk):
+            batch_input[row] = model_input
+        try:
+            _interpreter.set_tensor(input_details['index'], batch_input)
+            _interpreter.invoke()
+            probabilities = _interpreter.get_tensor(output_details['index'])
+        except Exception as e:
+            # Logged and retried on the next run like a decode failure
+            results.extend({"path": path, "true": true_index, "error": f"Inference failed: {e}"}
+                           for path, true_index, _, _ in chunk)
+            continue
+        for row, (path, true_index, duration, _) in enumerate(chunk):
+            results.append({
+                "path": path,
+                "true": true_index,
+                "duration": duration,
+                "probabilities": probabilities[row].tolist(),
+            })
+    inference_time = time.perf_counter() - inference_start
+
+    return results, decode_time, inference_time
+
+
+# ---- Metrics ----
+def predict_index(probabilities, labels, threshold):
+    """Same decision rule as the live classify_audio: low confidence means background"""
+    best_index = int(np.argmax(probabilities))
+    if probabilities[best_index] >= threshold:
+        return best_index
+    return labels.index(BACKGROUND_LABEL) if BACKGROUND_LABEL in labels else best_index
+
+
+def compute_metrics(results, labels, threshold):
+    num_classes = len(labels)
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    for result in results:
+        if "probabilities" not in result:
+            continue
+        predicted = predict_index(np.asarray(result["probabilities"]), labels, threshold)
+        confusion[result["true"], predicted] += 1
+
+    true_positives = np.diag(confusion).astype(np.float64)
+    predicted_totals = confusion.sum(axis=0)
+    true_totals = confusion.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted_totals > 0, true_positives / predicted_totals, np.nan)
+        recall = np.where(true_totals > 0, true_positives / true_totals, np.nan)
+    accuracy = true_positives.sum() / max(confusion.sum(), 1)
+    return confusion, precision, recall, accuracy
+
+
+def format_report(labels, confusion, precision, recall, accuracy, throughput):
+    width = max(len(label) for label in labels) + 2
+    lines = ["Confusion matrix (rows = true, columns = predicted):"]
+    lines.append(" " * width + "".join(f"{label[:8]:>9}" for label in labels))
+    for i, label in enumerate(labels):
+        lines.append(f"{label:<{width}}" + "".join(f"{count:>9}" for count in confusion[i]))
+    lines.append("")
+    lines.append(f"{'Class':<{width}}{'Precision':>10}{'Recall':>10}{'Support':>10}")
+    for i, label in enumerate(labels):
+        lines.append(f"{label:<{width}}{precision[i]:>10.3f}{recall[i]:>10.3f}{confusion[i].sum():>10}")
+    lines.append("")
+    lines.append(f"Accuracy: {accuracy:.3f} over {confusion.sum()} clips")
+    for key, value in throughput.items():
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a sound classifier over a directory of labelled clips")
+    parser.add_argument("clips", help="Directory with one sub-directory of clips per label")
+    parser.add_argument("--model", default="../soundclassifier_with_metadata.tflite", help="TFLite model to evaluate")
+    parser.add_argument("--labels", default="../labels.txt", help="labels.txt matching the model")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Clips per inference batch")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD,
+                        help="Confidence threshold below which a clip counts as Background Noise")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Results file used to resume (default: <model name>.eval.jsonl)")
+    parser.add_argument("--report", default=None, help="Write the metrics as JSON to this file")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    checkpoint_path = args.checkpoint or os.path.splitext(os.path.basename(args.model))[0] + ".eval.jsonl"
+    done = load_checkpoint(checkpoint_path)
+
+    clips = list(find_clips(args.clips, labels))
+    pending = [(path, true_index) for path, true_index in clips if path not in done]
+    print(f"Found {len(clips)} clips, {len(done)} already evaluated, {len(pending)} to go")
+    print(f"Model: {args.model}, workers: {args.workers}, batch size: {args.batch_size}")
+
+    # Split cores between processes rather than letting every interpreter spawn its own threads
+    threads_per_worker = max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+    batches = [pending[i:i + args.batch_size] for i in range(0, len(pending), args.batch_size)]
+
+    start_time = time.time()
+    clips_done = 0
+    audio_seconds = 0.0
+    decode_time = 0.0
+    inference_time = 0.0
+    errors = 0
+    try:
+        with open(checkpoint_path, "a") as checkpoint, multiprocessing.Pool(
+                args.workers, initializer=init_worker,
+                initargs=(args.model, args.batch_size, threads_per_worker)) as pool:
+            for results, batch_decode_time, batch_inference_time in pool.imap_unordered(evaluate_batch, batches):
+                for result in results:
+                    checkpoint.write(json.dumps(result) + "\n")
+                    done[result["path"]] = result
+                    if "error" in result:
+                        errors += 1
+                        print(f"✗ {result['path']}: {result['error']}")
+                    else:
+                        audio_seconds += result["duration"]
+                checkpoint.flush()
+                clips_done += len(results)
+                decode_time += batch_decode_time
+                inference_time += batch_inference_time
+                elapsed = time.time() - start_time
+                print(f"\r{clips_done}/{len(pending)} clips, {clips_done / max(elapsed, 1e-9):.1f} clips/s", end="")
+        print()
+    except KeyboardInterrupt:
+        print(f"\nInterrupted, {clips_done} new results saved to {checkpoint_path}; rerun to resume")
+        sys.exit(1)
+
+    elapsed = time.time() - start_time
+    results = [done[path] for path, _ in clips if path in done]
+    confusion, precision, recall, accuracy = compute_metrics(results, labels, args.threshold)
+    throughput = {
+        "Wall time": f"{elapsed:.1f}s for {clips_done} new clips",
+        "Throughput": f"{clips_done / max(elapsed, 1e-9):.1f} clips/s, "
+                      f"{audio_seconds / max(elapsed, 1e-9):.1f}x real time",
+        "Worker time": f"decode {decode_time:.1f}s, inference {inference_time:.1f}s",
+        "Errors": errors,
+    }
+    print(format_report(labels, confusion, precision, recall, accuracy, throughput))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({
+                "model": args.model,
+                "labels": labels,
+                "threshold": args.threshold,
+                "confusion": confusion.tolist(),
+                "precision": [None if np.isnan(p) else p for p in precision.tolist()],
+                "recall": [None if np.isnan(r) else r for r in recall.tolist()],
+                "accuracy": accuracy,
+                "clips_per_second": clips_done / max(elapsed, 1e-9),
+            }, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
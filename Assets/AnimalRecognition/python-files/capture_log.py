@@ -0,0 +1,248 @@
+"""
+Append-only capture log of the windows the recognizer classified.
+
+The log is a single preallocated, memory-mapped file laid out as
+
+    [ header (4 KiB) | index records | int16 PCM segments ]
+
+Each classified window is stored as an int16 PCM segment together with an index record
+(timestamp, predicted class, confidence, full probability vector). The writer copies into
+the mapping on a background thread so `process_audio_queue` never waits on disk, and the
+record count in the header is only bumped after a segment and its record are complete,
+so a reader can open a file that is still being written.
+
+    reader = CaptureReader("captures/session.anicap")
+    for i in range(len(reader)):
+        samples = reader.window(i)          # zero-copy int16 view
+        record = reader.records[i]          # timestamp, class_id, confidence, probabilities
+"""
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+MAGIC = b"ANICAP01"
+HEADER_SIZE = 4096
+LABELS_FIELD_SIZE = 3584
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("sample_rate", "<u4"),
+    ("num_classes", "<u4"),
+    ("max_windows", "<u8"),
+    ("max_samples", "<u8"),
+    ("record_count", "<u8"),
+    ("sample_count", "<u8"),
+    ("labels_json", f"S{LABELS_FIELD_SIZE}"),
+])
+
+
+def record_dtype(num_classes):
+    """Index record layout for a model with `num_classes` outputs"""
+    return np.dtype([
+        ("timestamp", "<f8"),
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("class_id", "<i2"),
+        ("reserved", "<u2"),
+        ("confidence", "<f4"),
+        ("probabilities", "<f4", (num_classes,)),
+    ])
+
+
+def file_layout(num_classes, max_windows, max_samples):
+    """Return (index offset, data offset, total size) in bytes"""
+    index_offset = HEADER_SIZE
+    data_offset = index_offset + record_dtype(num_classes).itemsize * max_windows
+    # Keep the PCM region page aligned
+    data_offset = (data_offset + 4095) // 4096 * 4096
+    return index_offset, data_offset, data_offset + 2 * max_samples
+
+
+class CaptureWriter:
+    def __init__(self, path, labels, sample_rate, window_size, max_windows=5000, queue_size=32):
+        self.path = path
+        self.labels = list(labels)
+        self.num_classes = len(self.labels)
+        self.sample_rate = sample_rate
+
+        if os.path.exists(path):
+            self.mmap = np.memmap(path, mode="r+", dtype=np.uint8)
+            self.header = self.mmap[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0:1]
+            if bytes(self.header["magic"][0]) != MAGIC:
+                raise ValueError(f"{path} is not a capture log")
+            if int(self.header["num_classes"][0]) != self.num_classes:
+                raise ValueError(f"{path} was written for {int(self.header['num_classes'][0])} classes, "
+                                 f"model has {self.num_classes}")
+            try:
+                stored_labels = json.loads(bytes(self.header["labels_json"][0]).decode())
+            except ValueError:
+                # Label list too long for the header field; only the class count can be checked
+                stored_labels = self.labels
+            if stored_labels != self.labels:
+                raise ValueError(f"{path} was written for labels {stored_labels}, model has {self.labels}")
+            max_windows = int(self.header["max_windows"][0])
+            max_samples = int(self.header["max_samples"][0])
+            print(f"Appending to capture log {path} ({int(self.header['record_count'][0])} windows already stored)")
+        else:
+            max_samples = max_windows * window_size
+            _, _, total_size = file_layout(self.num_classes, max_windows, max_samples)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Reserve the whole file up front so appends never grow or fragment it
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, total_size)
+                else:
+                    os.ftruncate(fd, total_size)
+            finally:
+                os.close(fd)
+            self.mmap = np.memmap(path, mode="r+", dtype=np.uint8)
+            self.header = self.mmap[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0:1]
+            self.header["magic"] = MAGIC
+            self.header["sample_rate"] = sample_rate
+            self.header["num_classes"] = self.num_classes
+            self.header["max_windows"] = max_windows
+            self.header["max_samples"] = max_samples
+            self.header["record_count"] = 0
+            self.header["sample_count"] = 0
+            self.header["labels_json"] = json.dumps(self.labels).encode()[:LABELS_FIELD_SIZE]
+            print(f"Created capture log {path} ({total_size / 1e6:.0f} MB for {max_windows} windows)")
+
+        self.max_windows = max_windows
+        self.max_samples = max_samples
+        index_offset, data_offset, _ = file_layout(self.num_classes, max_windows, max_samples)
+        dtype = record_dtype(self.num_classes)
+        self.records = self.mmap[index_offset:index_offset + dtype.itemsize * max_windows].view(dtype)
+        self.samples = self.mmap[data_offset:data_offset + 2 * max_samples].view("<i2")
+
+        self.record_count = int(self.header["record_count"][0])
+        self.sample_count = int(self.header["sample_count"][0])
+        self.dropped = 0
+        self.is_full = False
+        # Set once a hot reload changes the labels; class ids would no longer match the header
+        self.labels_changed = False
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.is_running = True
+        self.thread = threading.Thread(target=self.write_loop, name="capture-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def append(self, audio_data, timestamp, probabilities, labels=None):
+        """Queue a classified window for writing; never blocks the caller
+
+        `labels` are the labels of the model that produced `probabilities`. A hot-reloaded
+        model with different labels (even in the same number) can't share this log.
+        """
+        if self.is_full or self.labels_changed:
+            return False
+        if len(probabilities) != self.num_classes or (labels is not None and list(labels) != self.labels):
+            self.labels_changed = True
+            print(f"Model labels changed, no more windows will be stored in capture log {self.path}")
+            return False
+        try:
+            self.queue.put_nowait((audio_data, timestamp, probabilities))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def write_loop(self):
+        while self.is_running or not self.queue.empty():
+            try:
+                audio_data, timestamp, probabilities = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                self.write_window(audio_data, timestamp, probabilities)
+            except Exception as e:
+                print(f"Error writing capture log: {e}")
+
+    def write_window(self, audio_data, timestamp, probabilities):
+        length = len(audio_data)
+        if self.record_count >= self.max_windows or self.sample_count + length > self.max_samples:
+            if not self.is_full:
+                print(f"Capture log {self.path} is full, no more windows will be stored")
+            self.is_full = True
+            return
+
+        offset = self.sample_count
+        segment = self.samples[offset:offset + length]
+        np.clip(np.asarray(audio_data, dtype=np.float32) * 32767.0, -32768, 32767, out=segment, casting="unsafe")
+
+        record = self.records[self.record_count]
+        record["timestamp"] = timestamp
+        record["offset"] = offset
+        record["length"] = length
+        class_id = int(np.argmax(probabilities))
+        record["class_id"] = class_id
+        record["confidence"] = probabilities[class_id]
+        record["probabilities"] = probabilities
+
+        # Publish only after the segment and record are in place
+        self.record_count += 1
+        self.sample_count += length
+        self.header["sample_count"] = self.sample_count
+        self.header["record_count"] = self.record_count
+
+    def close(self):
+        """Drain pending windows and flush the mapping to disk"""
+        self.is_running = False
+        self.thread.join(timeout=5.0)
+        self.mmap.flush()
+        if self.dropped:
+            print(f"Capture log dropped {self.dropped} windows because the writer fell behind")
+        print(f"Capture log {self.path} closed with {self.record_count} windows")
+
+
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self.mmap = np.memmap(path, mode="r", dtype=np.uint8)
+        self.header = self.mmap[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+        if bytes(self.header["magic"]) != MAGIC:
+            raise ValueError(f"{path} is not a capture log")
+
+        self.sample_rate = int(self.header["sample_rate"])
+        self.num_classes = int(self.header["num_classes"])
+        self.labels = json.loads(bytes(self.header["labels_json"]).rstrip(b"\0").decode())
+        max_windows = int(self.header["max_windows"])
+        max_samples = int(self.header["max_samples"])
+        index_offset, data_offset, _ = file_layout(self.num_classes, max_windows, max_samples)
+        dtype = record_dtype(self.num_classes)
+        self._records = self.mmap[index_offset:index_offset + dtype.itemsize * max_windows].view(dtype)
+        self._samples = self.mmap[data_offset:data_offset + 2 * max_samples].view("<i2")
+
+    def __len__(self):
+        # Re-read from the header so a live file shows newly published windows
+        return int(self.header["record_count"])
+
+    @property
+    def records(self):
+        """Structured view of all published index records"""
+        return self._records[:len(self)]
+
+    def window(self, i):
+        """Zero-copy int16 view of the i-th captured window"""
+        record = self.records[i]
+        offset = int(record["offset"])
+        return self._samples[offset:offset + int(record["length"])]
+
+    def window_float(self, i):
+        """Float32 copy of the i-th window scaled back to [-1, 1], ready for the model"""
+        return self.window(i).astype(np.float32) / 32767.0
+
+    def label(self, i):
+        """Predicted label name of the i-th window"""
+        return self.labels[int(self.records[i]["class_id"])]
+
+    def time_range(self, start_time, end_time):
+        """Indices of windows captured in [start_time, end_time)"""
+        timestamps = self.records["timestamp"]
+        return np.nonzero((timestamps >= start_time) & (timestamps < end_time))[0]
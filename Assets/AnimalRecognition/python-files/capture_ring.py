@@ -0,0 +1,86 @@
+"""
+Preallocated single-producer sample ring for handing audio between threads without locks.
+
+The producer keeps two monotonically increasing sample counts that only it ever assigns.
+Before touching any slot it announces the end of the write in progress in `writing`; once
+the samples are in place it publishes them by setting `written` to the same value. Readers
+never take a lock: they read up to `written`, copy the samples they want, and then check
+`writing`. Position p can only be overwritten once `writing` passes p + capacity, so a copy
+is valid exactly when `writing` afterwards hasn't moved that far; otherwise the reader
+retries or reports the samples as lost. The producer never waits for anyone.
+
+The recognizer uses two rings: the PortAudio callback writes raw device blocks into one
+(nothing but a copy and a counter bump on the real-time thread), and an ingest thread
+resamples them into a second ring at the model rate, from which the processing thread
+reads its windows.
+"""
+
+import numpy as np
+
+
+class SampleRing:
+    def __init__(self, capacity, channels=None, dtype=np.float32):
+        self.capacity = capacity
+        shape = (capacity,) if channels is None else (capacity, channels)
+        self.buffer = np.zeros(shape, dtype=dtype)
+        # Total samples ever written; the publish point for readers
+        self.written = 0
+        # End of the write in progress; slots below writing - capacity may be torn
+        self.writing = 0
+
+    def write(self, block):
+        """Copy a block in and publish it (single producer only)"""
+        count = len(block)
+        end = self.written + count
+        if count > self.capacity:
+            block = block[count - self.capacity:]
+            count = self.capacity
+        # Claim the slots before overwriting them so readers of the oldest samples notice
+        self.writing = end
+        start = (end - count) % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start:start + first] = block[:first]
+        if first < count:
+            self.buffer[:count - first] = block[first:]
+        # Publish only after the samples are in place
+        self.written = end
+
+    def available(self, start):
+        """Oldest sample position that can still be read, given a desired start"""
+        return max(start, self.writing - self.capacity)
+
+    def copy_range(self, start, end, out):
+        """Copy samples [start, end) into `out`; return False if they were overwritten meanwhile"""
+        if end > self.written or start < self.writing - self.capacity:
+            return False
+        offset = start % self.capacity
+        count = end - start
+        first = min(count, self.capacity - offset)
+        out[:first] = self.buffer[offset:offset + first]
+        if first < count:
+            out[first:count] = self.buffer[:count - first]
+        # The copy is only good if no write that began meanwhile reached `start`'s slot
+        return self.writing - self.capacity <= start
+
+    def read(self, start, end):
+        """Return a copy of samples [start, end), or None if they've been overwritten"""
+        out = np.empty((end - start,) + self.buffer.shape[1:], dtype=self.buffer.dtype)
+        return out if self.copy_range(start, end, out) else None
+
+    def read_from(self, position, out):
+        """Read everything published since `position` (up to len(out)) for a sequential consumer
+
+        Returns (samples, new position, lost) where `samples` is a view into `out` and `lost`
+        counts samples the producer overwrote before the consumer got to them.
+        """
+        lost = 0
+        while True:
+            start = self.available(position)
+            lost += start - position
+            position = start
+            end = min(self.written, start + len(out))
+            if end <= start:
+                # Nothing new, or an oversized write has claimed slots it hasn't published yet
+                return out[:0], position, lost
+            if self.copy_range(start, end, out):
+                return out[:end - start], end, lost
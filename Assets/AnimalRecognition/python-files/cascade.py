@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Cheap pre-classifier that lets the recognizer skip the full model on background noise.
+
+Most windows are "Background Noise". A tiny logistic scorer on log band-energy features
+estimates the probability that a window contains an animal; when it is confidently
+background the TFLite model is skipped. Anything uncertain or animal-like still goes
+through the full model, and a small random fraction of skipped windows is audited
+against the full model to keep track of how often the shortcut is wrong.
+
+The scorer is trained from a capture log (see capture_log.py), using the full model's
+live decisions as the teacher:
+
+    python cascade.py train captures/session.anicap --out cascade_model.npz
+    CASCADE_MODEL_PATH=cascade_model.npz python animal-recognizer.py
+"""
+
+import argparse
+import random
+
+from collections import namedtuple
+
+import numpy as np
+
+from audio_preprocessing import EXPECTED_INPUT_SIZE
+
+BACKGROUND_LABEL = "Background Noise"
+FRAME_SIZE = 512
+NUM_BANDS = 16
+
+CascadeDecision = namedtuple("CascadeDecision", ["animal_probability", "skip", "audited"])
+
+
+def band_edges(frame_size=FRAME_SIZE, num_bands=NUM_BANDS):
+    """Log-spaced FFT bin edges, roughly following how pitch is perceived"""
+    num_bins = frame_size // 2 + 1
+    edges = np.unique(np.geomspace(1, num_bins, num_bands + 1).astype(int))
+    return edges
+
+
+_EDGES = band_edges()
+_WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+
+
+def extract_features(audio_data):
+    """Summary statistics of log band energies over a window, as a float32 vector"""
+    audio_data = np.asarray(audio_data, dtype=np.float32)
+    if len(audio_data) < EXPECTED_INPUT_SIZE:
+        audio_data = np.pad(audio_data, (0, EXPECTED_INPUT_SIZE - len(audio_data)))
+    num_frames = len(audio_data) // FRAME_SIZE
+    frames = audio_data[:num_frames * FRAME_SIZE].reshape(num_frames, FRAME_SIZE) * _WINDOW
+
+    power = np.square(np.abs(np.fft.rfft(frames, axis=1)))
+    band_energy = np.add.reduceat(power[:, _EDGES[0]:], _EDGES[:-1] - _EDGES[0], axis=1)
+    log_bands = np.log10(band_energy + 1e-10)
+    frame_energy = np.log10(power.sum(axis=1) + 1e-10)
+    # Spectral flux picks up onsets, which background hiss lacks
+    flux = np.abs(np.diff(log_bands, axis=0)).mean(axis=1)
+
+    return np.concatenate((
+        log_bands.mean(axis=0),
+        log_bands.std(axis=0),
+        [frame_energy.mean(), frame_energy.max(), frame_energy.std(), flux.mean(), flux.max()],
+    )).astype(np.float32)
+
+
+class CheapClassifier:
+    """Logistic regression on standardized features: P(window contains an animal)"""
+
+    def __init__(self, mean, scale, weights, bias, skip_threshold):
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights
+        self.bias = float(bias)
+        self.skip_threshold = float(skip_threshold)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["mean"], data["scale"], data["weights"], data["bias"], data["skip_threshold"])
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, scale=self.scale, weights=self.weights,
+                 bias=self.bias, skip_threshold=self.skip_threshold)
+
+    def animal_probability(self, features):
+        z = ((features - self.mean) / self.scale) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    @classmethod
+    def train(cls, features, is_animal, target_recall=0.99, iterations=2000, learning_rate=0.1, l2=1e-3):
+        """Fit on (num_windows, num_features) features with boolean teacher labels"""
+        is_animal = np.asarray(is_animal, dtype=np.float64)
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0) + 1e-6
+        x = (features - mean) / scale
+
+        # Balance classes so the rare animal windows aren't drowned out
+        positives = max(is_animal.sum(), 1.0)
+        negatives = max(len(is_animal) - is_animal.sum(), 1.0)
+        sample_weight = np.where(is_animal > 0, 0.5 / positives, 0.5 / negatives)
+
+        weights = np.zeros(x.shape[1])
+        bias = 0.0
+        for _ in range(iterations):
+            p = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+            error = (p - is_animal) * sample_weight
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum()
+
+        classifier = cls(mean.astype(np.float32), scale.astype(np.float32), weights.astype(np.float32), bias, 0.0)
+        # Skip only below the score that still keeps target_recall of the animal windows
+        animal_scores = classifier.animal_probability(features[is_animal > 0])
+        if len(animal_scores):
+            classifier.skip_threshold = float(np.quantile(animal_scores, 1.0 - target_recall))
+        return classifier
+
+
+class Cascade:
+    def __init__(self, classifier, audit_rate=0.05):
+        self.classifier = classifier
+        self.audit_rate = audit_rate
+
+        self.windows = 0
+        self.skipped = 0
+        self.audited = 0
+        self.audit_agreements = 0
+        # agreement[cheap_says_animal][full_says_animal] for windows where the full model ran
+        self.agreement = np.zeros((2, 2), dtype=np.int64)
+
+    def decide(self, audio_data):
+        """Score a window and decide whether the full model can be skipped"""
+        self.windows += 1
+        animal_probability = float(self.classifier.animal_probability(extract_features(audio_data)))
+        if animal_probability >= self.classifier.skip_threshold:
+            return CascadeDecision(animal_probability, False, False)
+        if random.random() < self.audit_rate:
+            self.audited += 1
+            return CascadeDecision(animal_probability, False, True)
+        self.skipped += 1
+        return CascadeDecision(animal_probability, True, False)
+
+    def record_full_result(self, decision, full_is_animal):
+        """Compare a full model result against the cheap stage's decision"""
+        cheap_is_animal = decision.animal_probability >= self.classifier.skip_threshold
+        self.agreement[int(cheap_is_animal), int(full_is_animal)] += 1
+        if decision.audited and not full_is_animal:
+            self.audit_agreements += 1
+
+    @property
+    def savings(self):
+        """Fraction of windows that didn't need the full model"""
+        return self.skipped / self.windows if self.windows else 0.0
+
+    def report(self):
+        lines = [
+            f"Cascade: {self.skipped}/{self.windows} windows skipped the full model ({self.savings:.1%} saved)",
+        ]
+        if self.audited:
+            lines.append(f"  Audited skips: {self.audited}, full model agreed on {self.audit_agreements / self.audited:.1%}")
+        both_ran = self.agreement.sum()
+        if both_ran:
+            lines.append(f"  Cheap vs full on {both_ran} windows (rows cheap, columns full; background/animal):")
+            lines.append(f"    background: {self.agreement[0, 0]:>6} {self.agreement[0, 1]:>6}")
+            lines.append(f"    animal:     {self.agreement[1, 0]:>6} {self.agreement[1, 1]:>6}")
+        return "\n".join(lines)
+
+
+def train_from_capture(capture_paths, output_path, confidence_threshold=0.8, target_recall=0.99):
+    """Train a CheapClassifier from capture logs, using the full model's decisions as labels"""
+    from capture_log import CaptureReader
+
+    features = []
+    is_animal = []
+    for path in capture_paths:
+        reader = CaptureReader(path)
+        records = reader.records
+        background_id = reader.labels.index(BACKGROUND_LABEL) if BACKGROUND_LABEL in reader.labels else -1
+        for i in range(len(reader)):
+            features.append(extract_features(reader.window_float(i)))
+        # Same rule as classify_audio: low confidence counts as background
+        is_animal.extend((records["class_id"] != background_id) & (records["confidence"] >= confidence_threshold))
+        print(f"Loaded {len(reader)} windows from {path}")
+
+    features = np.stack(features)
+    is_animal = np.asarray(is_animal)
+    print(f"Training on {len(features)} windows ({is_animal.sum()} animal, {(~is_animal).sum()} background)")
+
+    classifier = CheapClassifier.train(features, is_animal, target_recall=target_recall)
+    scores = classifier.animal_probability(features)
+    would_skip = scores < classifier.skip_threshold
+    print(f"Skip threshold: {classifier.skip_threshold:.4f}")
+    print(f"On training data: {would_skip.mean():.1%} of windows skipped, "
+          f"{(would_skip & is_animal).sum()} animal windows missed")
+    classifier.save(output_path)
+    print(f"Saved cheap classifier to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the cascade pre-classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Train from one or more capture logs")
+    train_parser.add_argument("captures", nargs="+", help="Capture log files written with CAPTURE_PATH")
+    train_parser.add_argument("--out", default="cascade_model.npz", help="Output weights file")
+    train_parser.add_argument("--threshold", type=float, default=0.8, help="Full model confidence threshold")
+    train_parser.add_argument("--target-recall", type=float, default=0.99,
+                              help="Fraction of animal windows that must still reach the full model")
+    args = parser.parse_args()
+    train_from_capture(args.captures, args.out, args.threshold, args.target_recall)
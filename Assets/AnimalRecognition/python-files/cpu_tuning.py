@@ -0,0 +1,95 @@
+"""
+CPU tuning for the recognizer's pipeline threads (Linux).
+
+    INTERPRETER_THREADS=2    TFLite interpreter threads (0 = TFLite default)
+    CALLBACK_CPUS=3          cores for the PortAudio capture callback
+    INGEST_CPUS=3            cores for the thread resampling captured audio
+    PROCESSING_CPUS=1-2      cores for the inference thread
+    MAJORITY_CPUS=0          cores for the majority voting thread
+    CAPTURE_PRIORITY=70      SCHED_FIFO priority for the capture callback (0 = leave alone)
+    WARM_UP=1                run one inference on silence before the stream starts
+
+CPU lists use taskset syntax ("0-2,4"). Settings the platform or the process's privileges
+don't allow (SCHED_FIFO usually needs CAP_SYS_NICE or an rtprio limit) are reported once
+and skipped. Use benchmark_cpu_tuning.py to pick values for a given machine.
+"""
+
+import os
+import threading
+
+ROLES = ("callback", "ingest", "processing", "majority")
+
+
+def parse_cpu_list(text):
+    """Parse "0-2,4" into {0, 1, 2, 4}; empty means no pinning (None)"""
+    text = (text or "").strip()
+    if not text:
+        return None
+    cpus = set()
+    for part in text.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.update(range(int(first), int(last) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def format_cpu_list(cpus):
+    return ",".join(str(cpu) for cpu in sorted(cpus)) if cpus else "any"
+
+
+def pin_current_thread(cpus):
+    """Restrict the calling thread (pid 0 is the caller on Linux) to the given cores"""
+    os.sched_setaffinity(0, cpus)
+
+
+def set_realtime_priority(priority):
+    """Move the calling thread to SCHED_FIFO at the given priority (0 = back to normal)"""
+    if priority:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    else:
+        os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+
+
+class ThreadTuner:
+    """Applies per-role affinity and priority the first time each thread calls tune()"""
+
+    def __init__(self, affinity=None, capture_priority=0):
+        self.affinity = affinity or {}
+        self.capture_priority = capture_priority
+        self.tuned = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        affinity = {role: parse_cpu_list(os.getenv(f"{role.upper()}_CPUS", "")) for role in ROLES}
+        return cls({role: cpus for role, cpus in affinity.items() if cpus},
+                   int(os.getenv("CAPTURE_PRIORITY", "0")))
+
+    def tune(self, role):
+        """Tune the calling thread for its role; cheap after the first call from that thread"""
+        ident = threading.get_ident()
+        if ident in self.tuned:
+            return
+        with self.lock:
+            self.tuned.add(ident)
+
+        cpus = self.affinity.get(role)
+        if cpus:
+            try:
+                pin_current_thread(cpus)
+            except (OSError, AttributeError, ValueError) as e:
+                print(f"Could not pin {role} thread to CPUs {format_cpu_list(cpus)}: {e}")
+        if role == "callback" and self.capture_priority:
+            try:
+                set_realtime_priority(self.capture_priority)
+            except (OSError, AttributeError) as e:
+                print(f"Could not give the capture thread SCHED_FIFO priority {self.capture_priority}: {e}")
+
+    def describe(self):
+        parts = [f"{role} on CPUs {format_cpu_list(self.affinity.get(role))}" for role in ROLES]
+        if self.capture_priority:
+            parts.append(f"capture SCHED_FIFO {self.capture_priority}")
+        return ", ".join(parts)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Append-only journal of detection events written by the recognizer and the gateways.
+
+Every event is a fixed-size 24-byte record (timestamp, session, class id, event kind,
+confidence, latency). Each writer owns its own segment files in the journal directory,
+so the recognizer and the gateways can share a directory without coordinating:
+
+    [ header (4 KiB): magic, source, created, labels JSON | records ... ]
+
+append() only puts a tuple on a list (under a lock never held across I/O); a background
+thread writes the batch and fsyncs it every `fsync_interval` seconds and starts a new
+segment once one reaches `segment_bytes`.
+Class ids are per segment and the header's label table is rewritten before any record
+using a new label is written, so a crash loses at most the last unsynced batch.
+
+    EVENT_JOURNAL_DIR=journal python animal-recognizer.py
+    python event_journal.py summary journal --since 2026-01-01T09:00
+
+    reader = JournalReader("journal")
+    events = reader.load(start, end)      # numpy record array, class ids map to reader.labels
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b"ANIJRNL1"
+HEADER_SIZE = 4096
+SEGMENT_SUFFIX = ".anijrnl"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("record_size", "<u4"),
+    ("reserved", "<u4"),
+    ("created", "<f8"),
+    ("source", "S32"),
+    ("labels_json", f"S{HEADER_SIZE - 56}"),
+])
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("session", "<u4"),
+    ("class_id", "<u2"),
+    ("kind", "u1"),
+    ("flags", "u1"),
+    ("confidence", "<f4"),
+    ("latency", "<f4"),
+])
+
+# Event kinds
+DETECTION = 0     # one classified window
+MAJORITY = 1      # majority vote sent to the game
+PROVISIONAL = 2   # speculative early result
+CONFIRMED = 3
+RETRACTED = 4
+FORWARDED = 5     # result relayed by a gateway
+KIND_NAMES = ("detection", "majority", "provisional", "confirmed", "retracted", "forwarded")
+
+# Stored in place of a missing label (e.g. a gateway message without "animal")
+UNKNOWN_LABEL = "unknown"
+# Gateway clients choose their labels; longer ones are cut so any label fits in a header
+MAX_LABEL_LENGTH = 64
+
+
+def new_session_id():
+    """Random 32-bit session id"""
+    return int.from_bytes(os.urandom(4), "little")
+
+
+def gateway_event(data):
+    """Pull (label, confidence, latency, session) out of a web client's udp_message
+
+    Latency is measured from the client's ISO timestamp, so it includes the browser side.
+    Missing or malformed fields come back as NaN / None.
+    """
+    try:
+        confidence = float(data.get("confidence", "nan"))
+    except (TypeError, ValueError):
+        confidence = float("nan")
+    try:
+        sent = datetime.fromisoformat(str(data["timestamp"]).replace("Z", "+00:00")).timestamp()
+        latency = time.time() - sent
+    except (KeyError, ValueError):
+        latency = float("nan")
+    try:
+        session = int(data["session"]) & 0xFFFFFFFF
+    except (KeyError, TypeError, ValueError):
+        session = None
+    return data.get("animal"), confidence, latency, session
+
+
+class NullJournal:
+    """Stand-in used when the journal is off"""
+
+    def append(self, label, confidence, kind=DETECTION, latency=float("nan"), session=None, timestamp=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class JournalWriter:
+    def __init__(self, directory, source, segment_bytes=4 * 1024 * 1024, fsync_interval=1.0, session=None):
+        self.directory = directory
+        self.source = source
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.session = new_session_id() if session is None else session
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        # Only guards swapping the pending list, so append() never waits on a write or fsync
+        self.pending_lock = threading.Lock()
+        self.pending = []
+        self.segment_index = 0
+        self.label_ids = {}
+        self.segment_labels = []
+        self.fd = None
+        self.segment_size = 0
+        self.written = 0
+
+        self.open_segment()
+        self.is_running = True
+        self.thread = threading.Thread(target=self.flush_loop, name=f"journal-{source}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def append(self, label, confidence, kind=DETECTION, latency=float("nan"), session=None, timestamp=None):
+        """Record an event; never touches the disk"""
+        event = (time.time() if timestamp is None else timestamp,
+                 self.session if session is None else session,
+                 label, kind, float(confidence), float(latency))
+        with self.pending_lock:
+            self.pending.append(event)
+
+    def open_segment(self):
+        created = time.time()
+        self.segment_index += 1
+        path = os.path.join(self.directory,
+                            f"{self.source}-{int(created * 1000)}-{os.getpid()}-{self.segment_index}{SEGMENT_SUFFIX}")
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        self.label_ids = {}
+        self.segment_labels = []
+        self.created = created
+        self.write_header()
+        self.segment_size = HEADER_SIZE
+
+    def rotate(self):
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.open_segment()
+
+    def write_header(self):
+        labels_json = json.dumps(self.segment_labels).encode("utf-8")
+        self.header_label_count = len(self.segment_labels)
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["record_size"] = RECORD_DTYPE.itemsize
+        header["created"] = self.created
+        header["source"] = self.source.encode("utf-8")[:32]
+        header["labels_json"] = labels_json
+        os.pwrite(self.fd, header.tobytes(), 0)
+
+    def class_id(self, label):
+        """Class id of a label in this segment, or None if the header has no room for it"""
+        label = UNKNOWN_LABEL if label is None else str(label)[:MAX_LABEL_LENGTH]
+        class_id = self.label_ids.get(label)
+        if class_id is None:
+            labels_json = json.dumps(self.segment_labels + [label]).encode("utf-8")
+            if len(labels_json) > HEADER_DTYPE["labels_json"].itemsize:
+                return None
+            class_id = self.label_ids[label] = len(self.segment_labels)
+            self.segment_labels.append(label)
+        return class_id
+
+    def write_records(self, records):
+        """Append records to the current segment, updating its header first if labels were added"""
+        if not records:
+            return
+        if len(self.segment_labels) != self.header_label_count:
+            self.write_header()
+        data = np.array(records, dtype=RECORD_DTYPE).tobytes()
+        os.pwrite(self.fd, data, self.segment_size)
+        self.segment_size += len(data)
+        self.written += len(records)
+
+    def flush(self):
+        """Write pending events to the current segment and fsync it"""
+        with self.lock:
+            with self.pending_lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return
+            if self.segment_size >= self.segment_bytes:
+                self.rotate()
+
+            records = []
+            for timestamp, session, label, kind, confidence, latency in batch:
+                class_id = self.class_id(label)
+                if class_id is None:
+                    # This segment's label table is full; the rest of the batch goes to a new one
+                    self.write_records(records)
+                    records = []
+                    self.rotate()
+                    class_id = self.class_id(label)
+                records.append((timestamp, session, class_id, kind, 0, confidence, latency))
+            self.write_records(records)
+            os.fsync(self.fd)
+
+    def flush_loop(self):
+        while self.is_running:
+            time.sleep(self.fsync_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing event journal: {e}")
+
+    def close(self):
+        self.is_running = False
+        self.thread.join(timeout=self.fsync_interval + 1.0)
+        self.flush()
+        os.close(self.fd)
+
+
+def create_journal(directory, source, **kwargs):
+    """Create a journal writer, or a no-op journal when `directory` is empty"""
+    if not directory:
+        return NullJournal()
+    try:
+        return JournalWriter(directory, source, **kwargs)
+    except Exception as e:
+        print(f"Error opening event journal in {directory}: {e}")
+        return NullJournal()
+
+
+class JournalReader:
+    def __init__(self, directory):
+        self.directory = directory
+        self.labels = []
+        self.label_ids = {}
+        self.sources = []
+
+    def segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, f"*{SEGMENT_SUFFIX}")))
+
+    def global_id(self, label):
+        # Segments written before missing labels were coerced may hold null
+        label = UNKNOWN_LABEL if label is None else str(label)
+        if label not in self.label_ids:
+            self.label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return self.label_ids[label]
+
+    def read_segment(self, path):
+        """Return (header, records) with records memory-mapped; a torn last record is ignored"""
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            return None, None
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if count <= 0:
+            return header[0], np.zeros(0, dtype=RECORD_DTYPE)
+        return header[0], np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+    def load(self, start=None, end=None, kinds=None):
+        """Load events with start <= timestamp < end (unix seconds) from all segments
+
+        Returns a record array with `class_id` remapped to indices into self.labels and an
+        extra `source` field indexing self.sources.
+        """
+        dtype = np.dtype(RECORD_DTYPE.descr + [("source", "<u2")])
+        parts = []
+        for path in self.segment_paths():
+            header, records = self.read_segment(path)
+            if records is None or not len(records):
+                continue
+            # Segments are written in time order, so most can be skipped by their ends
+            if (end is not None and records["timestamp"][0] >= end) or \
+                    (start is not None and records["timestamp"][-1] < start):
+                continue
+
+            mask = np.ones(len(records), dtype=bool)
+            if start is not None:
+                mask &= records["timestamp"] >= start
+            if end is not None:
+                mask &= records["timestamp"] < end
+            if kinds is not None:
+                mask &= np.isin(records["kind"], kinds)
+            selected = records[mask]
+            if not len(selected):
+                continue
+
+            segment_labels = json.loads(header["labels_json"].decode("utf-8") or "[]")
+            # Segments from before label tables were bounded can hold ids missing from the header
+            selected = selected[selected["class_id"] < len(segment_labels)]
+            if not len(selected):
+                continue
+            mapping = np.array([self.global_id(label) for label in segment_labels] or [0], dtype=np.uint16)
+            source = header["source"].decode("utf-8")
+            if source not in self.sources:
+                self.sources.append(source)
+
+            part = np.empty(len(selected), dtype=dtype)
+            for name in RECORD_DTYPE.names:
+                part[name] = selected[name]
+            part["class_id"] = mapping[selected["class_id"]]
+            part["source"] = self.sources.index(source)
+            parts.append(part)
+
+        if not parts:
+            return np.zeros(0, dtype=dtype)
+        events = np.concatenate(parts)
+        return events[np.argsort(events["timestamp"], kind="stable")]
+
+
+def summarize(events, labels, sources):
+    """Per source/session/kind/class counts and confidence, as printable lines"""
+    groups = defaultdict(list)
+    for index, key in enumerate(zip(events["source"].tolist(), events["session"].tolist(),
+                                    events["kind"].tolist(), events["class_id"].tolist())):
+        groups[key].append(index)
+
+    lines = [f"{'source':<14} {'session':>10} {'kind':<12} {'class':<20} {'count':>6} {'mean conf':>9} "
+             f"{'min conf':>8} {'p50 latency':>11}"]
+    for (source, session, kind, class_id), indices in sorted(groups.items()):
+        selected = events[indices]
+        latencies = selected["latency"][~np.isnan(selected["latency"])]
+        # Gateways journal NaN when a client didn't send a confidence
+        confidences = selected["confidence"][~np.isnan(selected["confidence"])]
+        mean_confidence = f"{confidences.mean():.3f}" if len(confidences) else "-"
+        min_confidence = f"{confidences.min():.3f}" if len(confidences) else "-"
+        latency = f"{np.median(latencies) * 1000:.1f}ms" if len(latencies) else "-"
+        lines.append(f"{sources[source]:<14} {session:>10} {KIND_NAMES[kind]:<12} {labels[class_id]:<20} "
+                     f"{len(indices):>6} {mean_confidence:>9} {min_confidence:>8} "
+                     f"{latency:>11}")
+    return lines
+
+
+def parse_time(text):
+    if text is None:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the detection event journal")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="Event counts and confidence per session and class")
+    summary_parser.add_argument("directory", help="Journal directory")
+    summary_parser.add_argument("--since", default=None, help="Start time (ISO 8601 or unix seconds)")
+    summary_parser.add_argument("--until", default=None, help="End time (ISO 8601 or unix seconds)")
+    summary_parser.add_argument("--kind", choices=KIND_NAMES, action="append",
+                                help="Only these event kinds (repeatable)")
+    args = parser.parse_args()
+
+    reader = JournalReader(args.directory)
+    kinds = [KIND_NAMES.index(kind) for kind in args.kind] if args.kind else None
+    events = reader.load(parse_time(args.since), parse_time(args.until), kinds)
+    if not len(events):
+        print("No events in range")
+        return
+    print(f"{len(events)} events from {datetime.fromtimestamp(events['timestamp'][0]).isoformat()} "
+          f"to {datetime.fromtimestamp(events['timestamp'][-1]).isoformat()}")
+    for line in summarize(events, reader.labels, reader.sources):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Hot reload support for the animal recognition server.
+
+Watches the model, labels and config files. When the model or labels change, a new
+interpreter is built and warmed up on a background thread and then swapped into the
+running server between two inferences, so the audio buffer and the majority voting
+state are kept. Config changes are applied in place.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def load_config_file(config_path):
+    """Load runtime settings from a JSON config file, returning {} if it is missing"""
+    if not config_path or not os.path.exists(config_path):
+        return {}
+    try:
+        with open(config_path, "r") as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            print(f"Error loading config {config_path}: expected a JSON object")
+            return {}
+        return config
+    except Exception as e:
+        print(f"Error loading config {config_path}: {e}")
+        return {}
+
+
+def warm_up_interpreter(interpreter):
+    """Run one inference on silence so the first real window doesn't pay the setup cost"""
+    input_details = interpreter.get_input_details()[0]
+    silence = np.zeros(input_details['shape'], dtype=input_details['dtype'])
+    interpreter.set_tensor(input_details['index'], silence)
+    interpreter.invoke()
+
+
+def file_signature(path):
+    """Return (mtime, size) for a file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+class HotReloader:
+    def __init__(self, server, model_path, labels_path, config_path, poll_interval=1.0):
+        self.server = server
+        self.model_path = model_path
+        self.labels_path = labels_path
+        self.config_path = config_path
+        self.poll_interval = poll_interval
+
+        self.signatures = self.current_signatures()
+        # Changes are only applied once a file has stopped changing for one poll,
+        # so we never load a model that is still being copied into place
+        self.pending = {}
+        self.is_running = False
+        self.thread = None
+
+    def current_signatures(self):
+        return {
+            "model": file_signature(self.model_path),
+            "labels": file_signature(self.labels_path),
+            "config": file_signature(self.config_path),
+        }
+
+    def start(self):
+        """Start the file watching thread"""
+        self.is_running = True
+        self.thread = threading.Thread(target=self.watch_files, name="hot-reload")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the file watching thread"""
+        self.is_running = False
+
+    def watch_files(self):
+        """Poll the watched files and reload them once they are stable"""
+        print("Hot reload thread started")
+        while self.is_running:
+            try:
+                changed = self.poll()
+                if "model" in changed or "labels" in changed:
+                    self.reload_model()
+                if "config" in changed:
+                    self.reload_config()
+            except Exception as e:
+                print(f"Error in hot reload: {e}")
+                import traceback
+                traceback.print_exc()
+            time.sleep(self.poll_interval)
+
+    def poll(self):
+        """Return the names of the files whose change has settled since the last poll"""
+        settled = set()
+        for name, signature in self.current_signatures().items():
+            if signature == self.signatures[name]:
+                self.pending.pop(name, None)
+                continue
+            if signature is None:
+                # File removed (or mid-rename); keep using what we have
+                continue
+            if self.pending.get(name) == signature:
+                settled.add(name)
+                self.signatures[name] = signature
+                del self.pending[name]
+            else:
+                self.pending[name] = signature
+        return settled
+
+    def reload_model(self):
+        """Build and warm up a new interpreter, then swap it into the server"""
+        print(f"🔄 Model or labels changed, reloading {self.model_path}")
+        start_time = time.time()
+        labels = self.server.load_labels(self.labels_path)
+        interpreter = self.server.load_model(self.model_path)
+        if interpreter is None:
+            print("✗ Reload failed, keeping the current model")
+            return
+
+        output_size = interpreter.get_output_details()[0]['shape'][-1]
+        if output_size != len(labels):
+            print(f"✗ Model has {output_size} outputs but {len(labels)} labels, keeping the current model")
+            return
+
+        try:
+            warm_up_interpreter(interpreter)
+        except Exception as e:
+            print(f"✗ Warm-up of the new model failed ({e}), keeping the current model")
+            return
+
+        self.server.swap_model(interpreter, labels)
+        print(f"✓ Model reloaded in {time.time() - start_time:.2f}s")
+
+    def reload_config(self):
+        """Apply the config file to the running server"""
+        print(f"🔄 Config changed, reloading {self.config_path}")
+        self.server.apply_config(load_config_file(self.config_path))
@@ -0,0 +1,200 @@
+"""
+Low-overhead sampling profiler for the recognizer and the gateways.
+
+A background thread periodically samples the Python stacks of every other thread with
+sys._current_frames(). Each sample is tagged with the thread name and the pipeline stage
+that thread is currently in (set with `profiler.stage("inference")`), and the results are
+written as collapsed stacks that flamegraph.pl / speedscope / inferno can render directly:
+
+    python animal-recognizer.py --profile
+    flamegraph.pl profile.collapsed.txt > profile.svg
+"""
+
+import os
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off, so stage markers cost almost nothing"""
+    _null_context = nullcontext()
+
+    def stage(self, name):
+        return self._null_context
+
+    def name_thread(self, name):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def write_report(self, output_prefix, top_n=20):
+        pass
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+
+        # Per-thread stage stacks; only the owning thread mutates its own list
+        self.stages = {}
+        self.thread_names = {}
+
+        self.stack_counts = Counter()
+        self.line_counts = Counter()
+        self.sample_count = 0
+        self.failed_samples = 0
+        self.sampling_time = 0.0
+        self.started_at = None
+        self.stopped_at = None
+        self.is_running = False
+        self.thread = None
+
+    @contextmanager
+    def stage(self, name):
+        """Tag samples taken from the current thread with a pipeline stage"""
+        stack = self.stages.get(threading.get_ident())
+        if stack is None:
+            stack = self.stages.setdefault(threading.get_ident(), [])
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def name_thread(self, name):
+        """Give the current thread a readable name (e.g. the PortAudio callback thread)"""
+        ident = threading.get_ident()
+        if ident not in self.thread_names:
+            self.thread_names[ident] = name
+
+    def start(self):
+        """Start the sampling thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self.sample_loop, name="profiler")
+        self.thread.daemon = True
+        self.thread.start()
+        print(f"Profiler started (sampling every {self.interval * 1000:.1f}ms)")
+
+    def stop(self):
+        """Stop the sampling thread"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        self.stopped_at = time.time()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    def sample_loop(self):
+        own_ident = threading.get_ident()
+        while self.is_running:
+            sample_start = time.perf_counter()
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                try:
+                    self.record_sample(ident, frame, thread_names)
+                except Exception:
+                    # One odd frame or racing thread must not end profiling for the whole run
+                    self.failed_samples += 1
+            self.sample_count += 1
+            self.sampling_time += time.perf_counter() - sample_start
+            time.sleep(self.interval)
+
+    def record_sample(self, ident, frame, thread_names):
+        thread_name = self.thread_names.get(ident) or thread_names.get(ident, f"thread-{ident}")
+        # The owning thread pushes and pops concurrently; copy before looking at the top
+        stage_stack = list(self.stages.get(ident) or ())
+        stage = stage_stack[-1] if stage_stack else "idle"
+
+        leaf = frame
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.reverse()
+
+        self.stack_counts[(thread_name, stage, tuple(frames))] += 1
+        leaf_code = leaf.f_code
+        self.line_counts[(stage, f"{os.path.basename(leaf_code.co_filename)}:{leaf.f_lineno} {leaf_code.co_name}")] += 1
+
+    def write_collapsed(self, path):
+        """Write samples as collapsed stacks: thread;stage:<name>;frame;frame count"""
+        with open(path, "w") as f:
+            for (thread_name, stage, frames), count in sorted(self.stack_counts.items()):
+                stack = ";".join([thread_name, f"stage:{stage}", *frames])
+                f.write(f"{stack} {count}\n")
+
+    def summary(self, top_n=20):
+        """Build a human readable summary of where the samples landed"""
+        total = sum(self.stack_counts.values()) or 1
+        elapsed = (self.stopped_at or time.time()) - (self.started_at or time.time())
+
+        per_stage = Counter()
+        per_thread = Counter()
+        for (thread_name, stage, _), count in self.stack_counts.items():
+            per_stage[(thread_name, stage)] += count
+            per_thread[thread_name] += count
+
+        lines = [
+            f"Profile: {self.sample_count} sampling passes over {elapsed:.1f}s, {total} thread samples",
+            f"Profiler overhead: {self.sampling_time / max(elapsed, 1e-9):.2%} of one core",
+            "",
+            "Samples by thread / stage:",
+        ]
+        if self.failed_samples:
+            lines.insert(2, f"Samples that failed to record: {self.failed_samples}")
+        for (thread_name, stage), count in per_stage.most_common(top_n):
+            lines.append(f"  {count / per_thread[thread_name]:6.1%}  {thread_name} / {stage}")
+
+        lines.append("")
+        lines.append(f"Top {top_n} lines (excluding idle):")
+        busy_lines = Counter({key: count for key, count in self.line_counts.items() if key[0] != "idle"})
+        busy_total = sum(busy_lines.values()) or 1
+        for (stage, location), count in busy_lines.most_common(top_n):
+            lines.append(f"  {count / busy_total:6.1%}  [{stage}] {location}")
+        return "\n".join(lines)
+
+    def write_report(self, output_prefix, top_n=20):
+        """Write the collapsed stacks and summary and print the summary"""
+        collapsed_path = f"{output_prefix}.collapsed.txt"
+        summary_path = f"{output_prefix}.summary.txt"
+        self.write_collapsed(collapsed_path)
+        summary = self.summary(top_n)
+        with open(summary_path, "w") as f:
+            f.write(summary + "\n")
+        print(summary)
+        print(f"Collapsed stacks written to {collapsed_path}")
+        print(f"Summary written to {summary_path}")
+
+
+def add_profile_arguments(parser):
+    """Add the shared --profile options to an argparse parser"""
+    parser.add_argument("--profile", action="store_true",
+                        help="Sample stacks per thread and pipeline stage and write a flame graph profile on exit")
+    parser.add_argument("--profile-output", default="profile",
+                        help="Prefix for the profile output files (default: profile)")
+    parser.add_argument("--profile-interval", type=float, default=0.01,
+                        help="Seconds between stack samples (default: 0.01)")
+    parser.add_argument("--profile-top", type=int, default=20,
+                        help="Number of entries in the summary (default: 20)")
+
+
+def create_profiler(args):
+    """Create a profiler from parsed --profile arguments"""
+    if args.profile:
+        return SamplingProfiler(interval=args.profile_interval)
+    return NullProfiler()
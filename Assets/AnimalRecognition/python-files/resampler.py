@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Streaming polyphase resampler for the capture path.
+
+Lets the input stream run at the device's native rate (44.1/48 kHz, any channel count)
+and turns each callback block into 16 kHz mono for the recognizer's buffer. The filter
+history and the output phase are carried across blocks, so consecutive blocks resample
+exactly as if the whole stream had been processed at once.
+
+    python resampler.py --benchmark     # CPU cost per second of audio
+"""
+
+import argparse
+import time
+
+from math import gcd
+
+import numpy as np
+
+from audio_preprocessing import SAMPLE_RATE
+
+
+def design_lowpass(up, down, taps_per_phase, rolloff=0.9, beta=8.0):
+    """Kaiser-windowed sinc low-pass for rational resampling by up/down"""
+    num_taps = taps_per_phase * up
+    # Cut off just below the lower of the two Nyquist rates, in units of the upsampled rate
+    cutoff = rolloff / max(up, down)
+    n = np.arange(num_taps) - (num_taps - 1) / 2.0
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(num_taps, beta)
+    # Gain of `up` compensates for the zeros inserted by upsampling
+    return (taps * up / taps.sum()).astype(np.float32)
+
+
+class StreamingResampler:
+    def __init__(self, input_rate, output_rate=SAMPLE_RATE, channels=1, taps_per_phase=32):
+        self.input_rate = int(input_rate)
+        self.output_rate = int(output_rate)
+        self.channels = channels
+
+        divisor = gcd(self.input_rate, self.output_rate)
+        self.up = self.output_rate // divisor
+        self.down = self.input_rate // divisor
+        self.passthrough = self.up == self.down
+
+        taps = design_lowpass(self.up, self.down, taps_per_phase)
+        # phases[p, k] = taps[k * up + p]: the taps applied to x[i - k] for output phase p
+        self.phases = taps.reshape(taps_per_phase, self.up).T.copy()
+        self.taps_per_phase = taps_per_phase
+        self.tap_offsets = np.arange(taps_per_phase)
+
+        # Last taps_per_phase - 1 mono input samples from the previous block
+        self.history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        # Position of the next output sample, in upsampled samples from the start of the next block
+        self.position = 0
+
+    def downmix(self, block):
+        """Average all channels into a float32 mono block"""
+        if block.ndim == 1:
+            return block.astype(np.float32, copy=False)
+        if block.shape[1] == 1:
+            return block[:, 0].astype(np.float32, copy=False)
+        return block.mean(axis=1, dtype=np.float32)
+
+    def process(self, block):
+        """Resample one (frames,) or (frames, channels) block; returns float32 mono output"""
+        mono = self.downmix(block)
+        if self.passthrough:
+            return mono.copy()
+
+        block_length = len(mono)
+        end = block_length * self.up
+        if self.position >= end:
+            # Block too short to complete another output sample (only for tiny blocks)
+            self.history = np.concatenate((self.history, mono))[-(self.taps_per_phase - 1):]
+            self.position -= end
+            return np.zeros(0, dtype=np.float32)
+
+        extended = np.concatenate((self.history, mono))
+        positions = np.arange(self.position, end, self.down)
+        input_index = positions // self.up
+        phase = positions - input_index * self.up
+
+        # Row m gathers x[i - k] for k = 0..K-1; history shifts indices by K - 1
+        gather = (input_index + self.taps_per_phase - 1)[:, None] - self.tap_offsets[None, :]
+        output = np.einsum("ij,ij->i", extended[gather], self.phases[phase]).astype(np.float32, copy=False)
+
+        self.position = int(positions[-1]) + self.down - end
+        self.history = extended[-(self.taps_per_phase - 1):].copy()
+        return output
+
+    def reset(self):
+        """Forget the filter state (e.g. after the input stream restarts)"""
+        self.history[:] = 0
+        self.position = 0
+
+
+def benchmark(duration=10.0, block_seconds=0.1):
+    """Report the CPU cost of resampling one second of audio for common device settings"""
+    print(f"Resampling {duration:.0f}s of audio in {block_seconds * 1000:.0f}ms blocks to {SAMPLE_RATE} Hz mono")
+    print(f"{'Input':>12} {'Channels':>9} {'CPU ms / s audio':>17} {'Real-time factor':>17}")
+    for input_rate in (16000, 22050, 44100, 48000):
+        for channels in (1, 2):
+            resampler = StreamingResampler(input_rate, SAMPLE_RATE, channels)
+            block_size = int(input_rate * block_seconds)
+            num_blocks = int(duration / block_seconds)
+            rng = np.random.default_rng(0)
+            blocks = [rng.standard_normal((block_size, channels)).astype(np.float32) * 0.1 for _ in range(8)]
+
+            produced = 0
+            cpu_start = time.process_time()
+            for i in range(num_blocks):
+                produced += len(resampler.process(blocks[i % len(blocks)]))
+            cpu_time = time.process_time() - cpu_start
+
+            audio_seconds = num_blocks * block_size / input_rate
+            print(f"{input_rate:>10}Hz {channels:>9} {cpu_time / audio_seconds * 1000:>17.3f} "
+                  f"{audio_seconds / max(cpu_time, 1e-9):>16.0f}x")
+            expected = audio_seconds * SAMPLE_RATE
+            if abs(produced - expected) > 1:
+                print(f"  ✗ produced {produced} samples, expected {expected:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming polyphase resampler")
+    parser.add_argument("--benchmark", action="store_true", help="Measure CPU cost per second of audio")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of audio per benchmark case")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.duration)
+    else:
+        parser.print_help()
@@ -0,0 +1,133 @@
+"""
+Shadow A/B evaluation of a candidate model on live traffic.
+
+The candidate (e.g. soundclassifier_with_metadata_latest.tflite) runs on the same windows
+as the live model, in its own worker thread with its own interpreter, off the critical
+path. The worker runs at a lower scheduling priority, holds at most one pending window,
+and is only fed while the primary queue is empty, so under CPU pressure shadow work is
+what gets dropped. Agreement, per-class disagreement and relative latency are reported
+on shutdown.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from collections import Counter
+
+import numpy as np
+
+from audio_preprocessing import DEFAULT_MAX_GAIN, prepare_model_input
+
+BACKGROUND_LABEL = "Background Noise"
+
+
+class ShadowEvaluator:
+    def __init__(self, model_path, labels, num_threads=1, nice=10, max_gain=DEFAULT_MAX_GAIN):
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.labels = labels
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.nice = nice
+        self.max_gain = max_gain
+
+        # One slot: while the candidate is still busy with a window, new ones are dropped
+        self.queue = queue.Queue(maxsize=1)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.compared = 0
+        self.agreed = 0
+        self.disagreements = Counter()
+        self.primary_latency = 0.0
+        self.candidate_latency = 0.0
+
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run, name="shadow")
+        self.thread.daemon = True
+        self.thread.start()
+        print(f"Shadow evaluation of {self.model_path} started")
+
+    def stop(self):
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=2.0)
+
+    def submit(self, audio_data, gain, primary_label, primary_latency, confidence_threshold):
+        """Offer a window the primary model classified; never blocks"""
+        self.submitted += 1
+        try:
+            self.queue.put_nowait((audio_data, gain, primary_label, primary_latency, confidence_threshold))
+        except queue.Full:
+            self.dropped += 1
+
+    def lower_priority(self):
+        """Make the shadow thread yield to the primary threads (Linux: per-thread nice)"""
+        if not self.nice or not hasattr(os, "setpriority"):
+            return
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+        except OSError as e:
+            print(f"Could not lower shadow thread priority: {e}")
+
+    def classify(self, audio_data, gain, confidence_threshold):
+        input_details = self.interpreter.get_input_details()[0]
+        output_details = self.interpreter.get_output_details()[0]
+        model_input = prepare_model_input(audio_data, max_gain=self.max_gain, gain=gain).reshape(1, -1)
+        self.interpreter.set_tensor(input_details['index'], model_input)
+        self.interpreter.invoke()
+        probabilities = self.interpreter.get_tensor(output_details['index'])[0]
+
+        best_idx = int(np.argmax(probabilities))
+        if probabilities[best_idx] < confidence_threshold:
+            return BACKGROUND_LABEL
+        return self.labels[best_idx] if best_idx < len(self.labels) else f"Unknown_{best_idx}"
+
+    def run(self):
+        self.lower_priority()
+        while self.is_running:
+            try:
+                audio_data, gain, primary_label, primary_latency, confidence_threshold = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                start_time = time.perf_counter()
+                candidate_label = self.classify(audio_data, gain, confidence_threshold)
+                candidate_latency = time.perf_counter() - start_time
+            except Exception as e:
+                print(f"Error in shadow evaluation: {e}")
+                continue
+
+            with self.lock:
+                self.compared += 1
+                self.primary_latency += primary_latency
+                self.candidate_latency += candidate_latency
+                if candidate_label == primary_label:
+                    self.agreed += 1
+                else:
+                    self.disagreements[(primary_label, candidate_label)] += 1
+
+    def report(self):
+        with self.lock:
+            if not self.compared:
+                return f"Shadow: no windows compared ({self.dropped}/{self.submitted} dropped)"
+            lines = [
+                f"Shadow evaluation of {self.model_path}:",
+                f"  Compared {self.compared} windows, agreement {self.agreed / self.compared:.1%} "
+                f"({self.dropped}/{self.submitted} windows dropped under load)",
+                f"  Mean latency: primary {self.primary_latency / self.compared * 1000:.1f}ms, "
+                f"candidate {self.candidate_latency / self.compared * 1000:.1f}ms "
+                f"({self.candidate_latency / max(self.primary_latency, 1e-9):.2f}x)",
+            ]
+            if self.disagreements:
+                lines.append("  Disagreements (primary -> candidate):")
+                for (primary_label, candidate_label), count in self.disagreements.most_common():
+                    lines.append(f"    {primary_label} -> {candidate_label}: {count}")
+            return "\n".join(lines)
@@ -0,0 +1,120 @@
+"""
+Speculative early detection from partial windows.
+
+The model wants a full 2.75 s window, so a sound that has just started only dominates a
+window well after the player made it. In speculative mode an energy-based onset detector
+watches the capture blocks; from the onset on, growing partial windows (zero padded by
+the normal preprocessing) are classified every `interval` seconds and the first animal
+result is published as provisional. The first regular window that covers the whole
+speculative span then confirms or retracts it.
+
+UDP messages:
+    Cow,0.912,provisional    sent as soon as a partial window is confident
+    Cow,0.874,confirmed      the full window agreed
+    Cow,0.000,retracted      the full window disagreed; undo the early reaction
+"""
+
+import numpy as np
+
+
+class OnsetDetector:
+    """Flags the block where the level jumps well above an adaptive noise floor"""
+
+    def __init__(self, ratio=4.0, min_rms=0.005, floor_smoothing=0.05):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.floor_smoothing = floor_smoothing
+        self.noise_floor = None
+        self.in_sound = False
+
+    def update(self, block):
+        """Feed one mono block; returns True only on the block where a sound starts"""
+        rms = float(np.sqrt(np.mean(np.square(block)))) if len(block) else 0.0
+        if self.noise_floor is None:
+            self.noise_floor = rms
+            return False
+
+        threshold = max(self.noise_floor * self.ratio, self.min_rms)
+        if rms < threshold:
+            # Only quiet blocks move the floor, so a long sound can't raise it
+            self.noise_floor += self.floor_smoothing * (rms - self.noise_floor)
+            self.in_sound = False
+            return False
+
+        if self.in_sound:
+            return False
+        self.in_sound = True
+        return True
+
+
+class SpeculativeDetector:
+    def __init__(self, sample_rate, interval=0.25, max_seconds=1.5, preroll=0.1, onset_ratio=4.0):
+        self.onset_detector = OnsetDetector(ratio=onset_ratio)
+        self.interval_samples = int(interval * sample_rate)
+        self.max_samples = int(max_seconds * sample_rate)
+        self.preroll_samples = int(preroll * sample_rate)
+
+        # Sample index (in samples received so far) where the current speculation started
+        self.onset_sample = None
+        self.next_partial_at = None
+        # Onset of the partial window on_block last asked for (onset_sample is already
+        # cleared when that was the final one)
+        self.partial_onset = None
+
+        # Provisional result waiting for its full window: (onset_sample, label, confidence)
+        self.provisional = None
+        # Onset of the last provisional that was confirmed or retracted
+        self.settled_onset = None
+
+    def on_block(self, block, samples_received):
+        """Called from the capture path after a block is buffered.
+
+        Returns the length of the partial window to classify now, or None.
+        """
+        block_start = samples_received - len(block)
+        if self.onset_detector.update(block) and self.onset_sample is None:
+            self.onset_sample = max(0, block_start - self.preroll_samples)
+            self.next_partial_at = block_start + self.interval_samples
+
+        if self.onset_sample is None or samples_received < self.next_partial_at:
+            return None
+
+        partial_length = samples_received - self.onset_sample
+        self.partial_onset = self.onset_sample
+        if partial_length >= self.max_samples:
+            # Speculation span complete; the regular windows take over from here
+            self.onset_sample = None
+            partial_length = self.max_samples
+        else:
+            self.next_partial_at += self.interval_samples
+        return partial_length
+
+    def accept_provisional(self, onset_sample, label, confidence):
+        """Record a provisional result.
+
+        Returns (publish, superseded label). A sound keeps the first provisional label it
+        got until its full window settles it; a new onset replaces a still-pending one,
+        whose label comes back as superseded so it can be retracted first.
+        """
+        if onset_sample == self.settled_onset:
+            return False, None
+        superseded = None
+        if self.provisional:
+            if self.provisional[0] == onset_sample:
+                return False, None
+            superseded = self.provisional[1]
+        self.provisional = (onset_sample, label, confidence)
+        return True, superseded
+
+    def is_confirm_window(self, window_end):
+        """True if a regular window ending at `window_end` covers the whole speculative span"""
+        return self.provisional is not None and window_end >= self.provisional[0] + self.max_samples
+
+    def resolve(self, label):
+        """Confirm or retract the provisional result against the full window's label.
+
+        Returns (provisional label, confirmed) and clears the provisional state.
+        """
+        self.settled_onset, provisional_label, _ = self.provisional
+        self.provisional = None
+        return provisional_label, label == provisional_label
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Stress test for the handoff between the audio callback and the processing thread.
+
+A clock thread plays the part of PortAudio: every block period it calls the capture
+callback with a fresh block and measures how long the callback takes and how late it was
+called. If a callback starts more than `--device-buffer` blocks late, the device buffer
+would have overflowed and the block counts as an xrun. Meanwhile the "inference" is
+stalled at random, both sleeping and holding the GIL, to show that nothing the
+processing side does can hold up the callback.
+
+Every sample handed out of the capture ring is checked against what the clock fed in, and
+before the run a producer thread hammers a ring while a reader chases its oldest samples,
+so torn reads fail the test even when no samples were reported lost.
+
+    python stress_capture_handoff.py --duration 30 --stall-max 3.0
+    python stress_capture_handoff.py --legacy       # the old deque + queue.Queue callback, for comparison
+    python stress_capture_handoff.py --recognizer   # drive the real AudioRecognitionServer (needs its dependencies)
+
+Exits non-zero if any xrun, lost capture sample or torn read was seen.
+"""
+
+import argparse
+import queue
+import random
+import sys
+import threading
+import time
+
+from collections import deque
+
+import numpy as np
+
+from agc import StreamingGainControl
+from audio_preprocessing import EXPECTED_INPUT_SIZE, SAMPLE_RATE, prepare_model_input
+from capture_ring import SampleRing
+from resampler import StreamingResampler
+from speculative import SpeculativeDetector
+
+
+class StallInjector:
+    """Stands in for inference: usually quick, sometimes stalled for a long time"""
+
+    def __init__(self, probability, max_stall, seed=0):
+        self.probability = probability
+        self.max_stall = max_stall
+        self.random = random.Random(seed)
+        self.stalls = 0
+
+    def __call__(self, audio_data):
+        prepare_model_input(audio_data)
+        time.sleep(0.02)
+        if self.random.random() < self.probability:
+            self.stalls += 1
+            stall = self.random.uniform(0.1, self.max_stall)
+            if self.random.random() < 0.5:
+                time.sleep(stall)
+            else:
+                # Pure Python spin: holds the GIL except at the interpreter's switch interval
+                deadline = time.perf_counter() + stall
+                while time.perf_counter() < deadline:
+                    pass
+
+
+class CheckedRing(SampleRing):
+    """Capture ring that checks every sequential read against the looped source"""
+
+    def __init__(self, capacity, source):
+        super().__init__(capacity, source.shape[1])
+        self.source = source
+        self.corrupt_samples = 0
+
+    def read_from(self, position, out):
+        samples, position, lost = super().read_from(position, out)
+        if len(samples):
+            positions = np.arange(position - len(samples), position) % len(self.source)
+            expected = self.source[positions]
+            self.corrupt_samples += int(np.count_nonzero((samples != expected).any(axis=1)))
+        return samples, position, lost
+
+
+class HandoffPipeline:
+    """The recognizer's capture path: callback -> capture ring -> ingest -> audio ring -> processing"""
+
+    def __init__(self, capture_rate, source, infer, process_interval=0.5):
+        channels = source.shape[1]
+        self.capture_rate = capture_rate
+        self.capture_ring = CheckedRing(int(capture_rate * 2.0), source)
+        self.audio_ring = SampleRing(SAMPLE_RATE * 10)
+        self.resampler = StreamingResampler(capture_rate, SAMPLE_RATE, channels)
+        self.agc = StreamingGainControl(EXPECTED_INPUT_SIZE)
+        self.speculation = SpeculativeDetector(SAMPLE_RATE)
+        self.audio_queue = queue.Queue()
+        self.infer = infer
+        self.process_interval = process_interval
+        self.last_window_end = 0
+        self.lost_samples = 0
+        self.windows = 0
+        self.stale_windows = 0
+        self.is_running = False
+
+    def callback(self, indata):
+        self.capture_ring.write(indata)
+
+    def ingest(self):
+        block = np.empty((self.capture_ring.capacity // 4, self.capture_ring.buffer.shape[1]), dtype=np.float32)
+        position = 0
+        while self.is_running:
+            samples, position, lost = self.capture_ring.read_from(position, block)
+            self.lost_samples += lost
+            if not len(samples):
+                time.sleep(0.01)
+                continue
+            audio_data = self.resampler.process(samples)
+            self.audio_ring.write(audio_data)
+            self.agc.update(audio_data)
+            written = self.audio_ring.written
+            partial_length = self.speculation.on_block(audio_data, written)
+            if partial_length:
+                self.audio_queue.put((written - partial_length, written))
+            if written - self.last_window_end >= self.process_interval * SAMPLE_RATE and written >= EXPECTED_INPUT_SIZE:
+                self.audio_queue.put((written - EXPECTED_INPUT_SIZE, written))
+                self.last_window_end = written
+
+    def process(self):
+        while self.is_running:
+            try:
+                start, end = self.audio_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            audio_data = self.audio_ring.read(start, end)
+            if audio_data is None:
+                self.stale_windows += 1
+                continue
+            self.windows += 1
+            self.infer(audio_data)
+
+    def start(self):
+        self.is_running = True
+        self.threads = [threading.Thread(target=self.ingest, name="ingest", daemon=True),
+                        threading.Thread(target=self.process, name="processing", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.is_running = False
+        for thread in self.threads:
+            thread.join(timeout=5.0)
+
+
+class LegacyPipeline(HandoffPipeline):
+    """The previous callback: resample, deque, np.array(list(...)) and queue.Queue on the audio thread"""
+
+    def __init__(self, capture_rate, source, infer, process_interval=0.5):
+        super().__init__(capture_rate, source, infer, process_interval)
+        self.audio_buffer = deque(maxlen=EXPECTED_INPUT_SIZE)
+        self.last_process_time = time.time()
+
+    def callback(self, indata):
+        audio_data = self.resampler.process(indata)
+        self.audio_buffer.extend(audio_data)
+        current_time = time.time()
+        if current_time - self.last_process_time >= self.process_interval and len(self.audio_buffer) >= EXPECTED_INPUT_SIZE:
+            self.audio_queue.put(np.array(list(self.audio_buffer)))
+            self.last_process_time = current_time
+
+    def ingest(self):
+        pass
+
+    def process(self):
+        while self.is_running:
+            try:
+                audio_data = self.audio_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.windows += 1
+            self.infer(audio_data)
+
+
+class RecognizerPipeline:
+    """Drives the real AudioRecognitionServer threads with the clock thread as its audio device"""
+
+    def __init__(self, capture_rate, source, infer, process_interval=0.5):
+        from unified_runtime import load_recognizer_module
+
+        module = load_recognizer_module()
+        self.capture_rate = capture_rate
+        self.server = module.AudioRecognitionServer()
+        self.server.transport.close()
+        self.server.transport = NullTransport()
+        self.server.resampler = StreamingResampler(capture_rate, SAMPLE_RATE, source.shape[1])
+        self.capture_ring = CheckedRing(int(capture_rate * module.CAPTURE_RING_SECONDS), source)
+        self.server.capture_ring = self.capture_ring
+        classify_window = self.server.classify_window
+        self.windows = 0
+
+        def stalled_classify_window(audio_data, gain=None):
+            self.windows += 1
+            infer(audio_data)
+            return classify_window(audio_data, gain)
+
+        self.server.classify_window = stalled_classify_window
+
+    @property
+    def lost_samples(self):
+        return self.server.lost_samples
+
+    @property
+    def stale_windows(self):
+        return self.server.stale_windows
+
+    def callback(self, indata):
+        self.server.audio_callback(indata, len(indata), None, None)
+
+    def start(self):
+        self.server.is_running = True
+        for target, name in ((self.server.ingest_audio, "ingest"), (self.server.process_audio_queue, "processing"),
+                             (self.server.check_majority_periodically, "majority")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+
+    def stop(self):
+        self.server.is_running = False
+        time.sleep(0.5)
+
+
+class NullTransport:
+    def send(self, payload):
+        return True
+
+    def close(self):
+        pass
+
+
+def make_source(capture_rate, channels, block_size):
+    """A few seconds of noise with occasional loud bursts, a whole number of blocks long"""
+    rng = np.random.default_rng(0)
+    length = capture_rate * 4 // block_size * block_size
+    source = rng.normal(0, 0.02, (length, channels)).astype(np.float32)
+    for start in range(0, len(source), capture_rate):
+        source[start:start + capture_rate // 5] *= 20
+    return source
+
+
+def check_ring_reads(duration=3.0, capacity=4096, max_block=1024):
+    """Hammer a ring from a producer thread while a reader copies its oldest samples
+
+    Each sample holds its own position, so any read that passes validation but was
+    overwritten mid-copy shows up as a mismatch. Returns (reads, torn reads).
+    """
+    ring = SampleRing(capacity, dtype=np.float64)
+    stop = threading.Event()
+
+    def produce():
+        rng = np.random.default_rng(1)
+        position = 0
+        while not stop.is_set():
+            # Mostly device-sized blocks, now and then one larger than the ring
+            count = int(rng.integers(1, max_block)) if rng.random() > 0.01 else capacity + max_block
+            ring.write(np.arange(position, position + count, dtype=np.float64))
+            position += count
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    out = np.empty(max_block // 2)
+    reads = torn = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        samples, end, _ = ring.read_from(max(0, ring.written - ring.capacity), out)
+        if len(samples):
+            reads += 1
+            if not np.array_equal(samples, np.arange(end - len(samples), end)):
+                torn += 1
+    stop.set()
+    producer.join()
+    return reads, torn
+
+
+def run_clock(pipeline, source, block_size, device_buffer, duration):
+    """Call the callback once per block period like PortAudio would; return timings and xruns"""
+    capture_rate = pipeline.capture_rate
+    period = block_size / capture_rate
+    durations = []
+    lateness = []
+    xruns = 0
+    start = time.perf_counter()
+    for index in range(int(duration / period)):
+        deadline = start + index * period
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        called = time.perf_counter()
+        late = called - deadline
+        offset = (index * block_size) % len(source)
+        pipeline.callback(source[offset:offset + block_size])
+        durations.append(time.perf_counter() - called)
+        lateness.append(late)
+        if late > device_buffer * period:
+            xruns += 1
+    return np.asarray(durations), np.asarray(lateness), xruns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the audio callback handoff with inference stalls")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of simulated capture")
+    parser.add_argument("--capture-rate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--block-size", type=int, default=480, help="Frames per callback (480 = 10ms at 48kHz)")
+    parser.add_argument("--device-buffer", type=int, default=4,
+                        help="Blocks of slack the device has before it overflows")
+    parser.add_argument("--stall-probability", type=float, default=0.2, help="Chance an inference stalls")
+    parser.add_argument("--stall-max", type=float, default=2.0, help="Longest stall in seconds")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--legacy", action="store_true", help="Use the old queue.Queue/deque callback")
+    mode.add_argument("--recognizer", action="store_true", help="Drive the real AudioRecognitionServer")
+    args = parser.parse_args()
+
+    reads, torn_reads = check_ring_reads()
+    print(f"Ring check: {reads} reads of the oldest samples under a racing producer, {torn_reads} torn")
+
+    infer = StallInjector(args.stall_probability, args.stall_max)
+    source = make_source(args.capture_rate, args.channels, args.block_size)
+    pipeline_class = LegacyPipeline if args.legacy else RecognizerPipeline if args.recognizer else HandoffPipeline
+    pipeline = pipeline_class(args.capture_rate, source, infer)
+
+    print(f"{pipeline_class.__name__}: {args.duration:.0f}s at {args.capture_rate}Hz x{args.channels}, "
+          f"{args.block_size}-frame callbacks, stalls up to {args.stall_max}s")
+    pipeline.start()
+    try:
+        durations, lateness, xruns = run_clock(pipeline, source, args.block_size, args.device_buffer, args.duration)
+    finally:
+        pipeline.stop()
+
+    us = durations * 1e6
+    print(f"Callback time: p50 {np.percentile(us, 50):.1f}us  p99 {np.percentile(us, 99):.1f}us  max {us.max():.1f}us")
+    print(f"Callback lateness: p99 {np.percentile(lateness, 99) * 1000:.2f}ms  max {lateness.max() * 1000:.2f}ms")
+    print(f"Inference stalls injected: {infer.stalls}, windows processed: {pipeline.windows}, "
+          f"stale windows skipped: {pipeline.stale_windows}")
+    corrupt_samples = pipeline.capture_ring.corrupt_samples
+    print(f"Xruns: {xruns}, captured samples lost: {pipeline.lost_samples}, corrupted: {corrupt_samples}")
+
+    if xruns or pipeline.lost_samples or corrupt_samples or torn_reads:
+        print("✗ FAIL: the capture path lost or corrupted audio")
+        sys.exit(1)
+    print("✓ PASS: the callback never blocked long enough to lose audio and every read was intact")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,34 @@ UDP Connection Test Script
 
 This script tests the UDP connection between the animal recognition system and Unity.
 It sends a test message to the Unity AudioListener on port 5005.
+
+The `load` command turns it into a load generator for Unity's receiver and the gateways:
+
+    python test_udp.py load --target udp --format text --rate 200 --duration 10 --standin
+    python test_udp.py load --target http --pattern burst --burst-size 50 --standin
+    python test_udp.py load --target ws --pattern ramp --rate 500
+
+Payload formats (raw UDP target): `text` is the recognizer's "Label,conf", `json` is what
+the WebSocket proxy forwards and `name` is the bare animal name the HTTP gateway forwards.
+The HTTP and WebSocket targets use the gateways' own request format and measure round
+trip time from their acks. `--standin` binds a stand-in receiver on the UDP port (when
+Unity isn't running) that counts deliveries and, for JSON payloads, one-way latency.
 """
 
+import argparse
+import asyncio
 import socket
 import json
+import threading
 import time
+import http.client
+import urllib.parse
 from datetime import datetime
 
+import numpy as np
+
+ANIMALS = ["Cat", "Chicken", "Cow", "Frog", "Mouse", "Seagull"]
+
 def test_udp_connection(host='127.0.0.1', port=5005):
     """Test UDP connection by sending a test message"""
     try:
@@ -66,5 +87,280 @@ def main():
         print("\n✗ UDP connection test failed!")
         print("Check the error message above for details")
 
+# ---- Load generator ----
+def send_schedule(pattern, rate, duration, burst_size, burst_interval):
+    """Send times in seconds from the start for a rate pattern"""
+    if pattern == "constant":
+        return np.arange(0, duration, 1.0 / rate)
+    if pattern == "burst":
+        starts = np.arange(0, duration, burst_interval)
+        return np.repeat(starts, burst_size)
+    if pattern == "ramp":
+        # Rate grows linearly from 0 to `rate`: the n-th message goes out at sqrt(2n * duration / rate)
+        count = int(rate * duration / 2)
+        return np.sqrt(2 * np.arange(count) * duration / rate)
+    raise ValueError(f"Unknown pattern '{pattern}'")
+
+
+def make_payload(payload_format, sequence, rng):
+    """Build one message in the format a real producer would send"""
+    animal = ANIMALS[rng.integers(len(ANIMALS))]
+    confidence = round(float(rng.uniform(0.8, 1.0)), 3)
+    if payload_format == "text":
+        return f"{animal},{confidence:.3f}".encode("utf-8")
+    if payload_format == "name":
+        return animal.encode("utf-8")
+    # The proxy forwards the web client's JSON untouched; seq and sent_at are extra fields
+    return json.dumps({
+        "type": "udp_message",
+        "animal": animal,
+        "confidence": confidence,
+        "timestamp": datetime.now().isoformat(),
+        "seq": sequence,
+        "sent_at": time.time(),
+    }).encode("utf-8")
+
+
+class StandInReceiver:
+    """Counts what reaches the UDP port when Unity isn't there to receive it"""
+
+    def __init__(self, host, port):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.2)
+        self.received = 0
+        self.latencies = []
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run, name="standin")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while self.is_running:
+            try:
+                data, _ = self.socket.recvfrom(65535)
+            except socket.timeout:
+                continue
+            arrived = time.time()
+            self.received += 1
+            if data.startswith(b"{"):
+                try:
+                    self.latencies.append(arrived - json.loads(data)["sent_at"])
+                except (ValueError, KeyError):
+                    pass
+
+    def stop(self):
+        # Give in-flight datagrams a moment to land
+        time.sleep(0.5)
+        self.is_running = False
+        self.thread.join()
+        self.socket.close()
+
+
+class LoadResult:
+    def __init__(self):
+        self.sent = 0
+        self.errors = 0
+        self.round_trips = []
+        self.elapsed = 0.0
+
+
+def wait_until(start, offset):
+    delay = start + offset - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def run_udp_load(args, schedule, rng):
+    result = LoadResult()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    payloads = [make_payload(args.format, i, rng) for i in range(len(schedule))] if args.format != "json" else None
+    start = time.perf_counter()
+    for sequence, offset in enumerate(schedule):
+        wait_until(start, offset)
+        payload = payloads[sequence] if payloads else make_payload(args.format, sequence, rng)
+        try:
+            sock.sendto(payload, (args.host, args.port))
+            result.sent += 1
+        except OSError:
+            result.errors += 1
+    result.elapsed = time.perf_counter() - start
+    sock.close()
+    return result
+
+
+def http_request_body(rng):
+    animal = ANIMALS[rng.integers(len(ANIMALS))]
+    return json.dumps({
+        "type": "udp_message",
+        "animal": animal,
+        "confidence": round(float(rng.uniform(0.8, 1.0)), 3),
+        "timestamp": datetime.now().isoformat(),
+    })
+
+
+def run_http_load(args, schedule, rng):
+    """Open-loop POSTs to /udp from a pool of workers; each response is the ack"""
+    result = LoadResult()
+    url = urllib.parse.urlparse(args.url or "http://localhost:8005/udp")
+    lock = threading.Lock()
+    next_index = [0]
+    start = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                sequence = next_index[0]
+                next_index[0] += 1
+                body = http_request_body(rng) if sequence < len(schedule) else None
+            if body is None:
+                return
+            wait_until(start, schedule[sequence])
+            sent_at = time.perf_counter()
+            try:
+                connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=5.0)
+                connection.request("POST", url.path or "/udp", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                ok = response.status == 200 and json.loads(response.read()).get("status") == "success"
+                connection.close()
+            except (OSError, ValueError, http.client.HTTPException):
+                ok = False
+            with lock:
+                result.sent += 1
+                if ok:
+                    result.round_trips.append(time.perf_counter() - sent_at)
+                else:
+                    result.errors += 1
+
+    workers = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def websocket_connection(args, schedule, rng, result, start):
+    """One connection sends its share of the schedule; udp_acks come back in order"""
+    import websockets
+
+    pending = []
+    async with websockets.connect(args.url or "ws://localhost:8004") as websocket:
+        async def read_acks():
+            async for message in websocket:
+                ack = json.loads(message)
+                if ack.get("type") != "udp_ack" or not pending:
+                    continue
+                sent_at = pending.pop(0)
+                if ack.get("success"):
+                    result.round_trips.append(time.perf_counter() - sent_at)
+                else:
+                    result.errors += 1
+
+        reader = asyncio.create_task(read_acks())
+        for sequence, offset in enumerate(schedule):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            message = json.loads(make_payload("json", sequence, rng))
+            pending.append(time.perf_counter())
+            try:
+                await websocket.send(json.dumps(message))
+                result.sent += 1
+            except Exception:
+                pending.pop()
+                result.errors += 1
+        # Wait for the last acks
+        deadline = time.perf_counter() + 2.0
+        while pending and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        result.errors += len(pending)
+        reader.cancel()
+
+
+def run_websocket_load(args, schedule, rng):
+    result = LoadResult()
+
+    async def run():
+        start = time.perf_counter()
+        shares = [schedule[i::args.concurrency] for i in range(args.concurrency)]
+        outcomes = await asyncio.gather(*(websocket_connection(args, share, rng, result, start) for share in shares),
+                                        return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                print(f"✗ WebSocket connection failed: {outcome}")
+        result.elapsed = time.perf_counter() - start
+
+    asyncio.run(run())
+    return result
+
+
+def format_latencies(name, latencies):
+    if not latencies:
+        return f"{name}: no samples"
+    ms = np.asarray(latencies) * 1000
+    return (f"{name}: p50 {np.percentile(ms, 50):.2f}ms  p95 {np.percentile(ms, 95):.2f}ms  "
+            f"p99 {np.percentile(ms, 99):.2f}ms  max {ms.max():.2f}ms")
+
+
+def run_load(args):
+    """Generate load against the chosen target and print what came back"""
+    schedule = send_schedule(args.pattern, args.rate, args.duration, args.burst_size, args.burst_interval)
+    rng = np.random.default_rng(args.seed)
+
+    standin = None
+    if args.standin:
+        try:
+            standin = StandInReceiver(args.host, args.port)
+            print(f"Stand-in receiver listening on {args.host}:{args.port}")
+        except OSError as e:
+            print(f"Could not bind stand-in receiver on {args.host}:{args.port} ({e}); is Unity running?")
+
+    print(f"Sending {len(schedule)} messages to {args.target} ({args.pattern}, {args.format if args.target == 'udp' else 'gateway'} payloads)")
+    if args.target == "udp":
+        result = run_udp_load(args, schedule, rng)
+    elif args.target == "http":
+        result = run_http_load(args, schedule, rng)
+    else:
+        result = run_websocket_load(args, schedule, rng)
+
+    print(f"Sent {result.sent} in {result.elapsed:.2f}s: {result.sent / max(result.elapsed, 1e-9):.0f} msg/s "
+          f"achieved (target {len(schedule) / max(args.duration, 1e-9):.0f} msg/s average), {result.errors} errors")
+    if args.target != "udp":
+        print(format_latencies("Round trip (ack)", result.round_trips))
+    if standin:
+        standin.stop()
+        lost = result.sent - result.errors - standin.received if args.target != "udp" else result.sent - standin.received
+        print(f"Stand-in received {standin.received} ({max(lost, 0)} lost)")
+        if standin.latencies:
+            print(format_latencies("One-way to UDP port", standin.latencies))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test the UDP connection to Unity, or generate load")
+    subparsers = parser.add_subparsers(dest="command")
+    load = subparsers.add_parser("load", help="Send configurable load to Unity or the gateways")
+    load.add_argument("--target", choices=["udp", "http", "ws"], default="udp")
+    load.add_argument("--format", choices=["text", "json", "name"], default="text",
+                      help="Payload format for the udp target")
+    load.add_argument("--pattern", choices=["constant", "burst", "ramp"], default="constant")
+    load.add_argument("--rate", type=float, default=50.0, help="Messages per second (peak rate for ramp)")
+    load.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    load.add_argument("--burst-size", type=int, default=20, help="Messages per burst")
+    load.add_argument("--burst-interval", type=float, default=1.0, help="Seconds between bursts")
+    load.add_argument("--concurrency", type=int, default=4, help="HTTP workers / WebSocket connections")
+    load.add_argument("--host", default="127.0.0.1", help="UDP host (target and stand-in)")
+    load.add_argument("--port", type=int, default=5005, help="UDP port (target and stand-in)")
+    load.add_argument("--url", default=None, help="Gateway URL (default http://localhost:8005/udp or ws://localhost:8004)")
+    load.add_argument("--standin", action="store_true", help="Bind a stand-in receiver on the UDP port")
+    load.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    args = parse_args()
+    if args.command == "load":
+        run_load(args)
+    else:
+        main()
@@ -0,0 +1,350 @@
+"""
+Pluggable transports for delivering recognition results to a co-located consumer.
+
+Every transport is addressed by a URL:
+
+    udp://127.0.0.1:5005          loopback UDP (the default, what Unity listens on)
+    unix:///tmp/animorphosis.sock  Unix domain datagram socket
+    shm://animorphosis             shared-memory single-producer/single-consumer ring in
+                                   /dev/shm with a FIFO doorbell (Linux on x86 only)
+
+Senders never block: like UDP, a message is dropped (send returns False) when nobody is
+listening, the consumer has fallen a full ring behind, or the message is too large for
+the transport (252 bytes for shm://, a datagram for the others).
+"""
+
+import mmap
+import os
+import platform
+import select
+import socket
+import struct
+import threading
+import urllib.parse
+
+DEFAULT_TRANSPORT = "udp://127.0.0.1:5005"
+# The shared-memory ring has no memory barriers and relies on x86 keeping stores in order
+X86_MACHINES = ("x86_64", "amd64", "i386", "i486", "i586", "i686", "x86")
+# A shm sender re-checks that its segment is the consumer's current one this often even
+# when nothing has failed (a stat() per send would cost more than the send itself)
+SEGMENT_CHECK_INTERVAL = 64
+
+
+class UDPTransport:
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, payload):
+        try:
+            self.socket.sendto(payload, self.address)
+            return True
+        except OSError:
+            return False
+
+    def close(self):
+        self.socket.close()
+
+
+class UDPReceiver:
+    def __init__(self, host, port):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+
+    def recv(self, timeout=None):
+        """Return the next payload, or None on timeout"""
+        self.socket.settimeout(timeout)
+        try:
+            data, _ = self.socket.recvfrom(65535)
+            return data
+        except socket.timeout:
+            return None
+
+    def close(self):
+        self.socket.close()
+
+
+class UnixDatagramTransport:
+    def __init__(self, path):
+        self.path = path
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def send(self, payload):
+        try:
+            self.socket.sendto(payload, self.path)
+            return True
+        except OSError:
+            # Receiver not running, its queue is full, or the message is too large
+            return False
+
+    def close(self):
+        self.socket.close()
+
+
+class UnixDatagramReceiver:
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(path)
+
+    def recv(self, timeout=None):
+        self.socket.settimeout(timeout)
+        try:
+            return self.socket.recv(65535)
+        except socket.timeout:
+            return None
+
+    def close(self):
+        self.socket.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+# ---- Shared memory ring ----
+# Layout: [magic | capacity | slot size] [head on its own cache line] [tail on its own cache line] [slots]
+RING_MAGIC = b"ANIRING1"
+HEAD_OFFSET = 64
+TAIL_OFFSET = 128
+SLOTS_OFFSET = 192
+COUNTER = struct.Struct("<Q")
+LENGTH = struct.Struct("<I")
+
+
+class SharedMemoryRing:
+    """Memory-mapped SPSC ring of fixed-size slots; the producer owns head, the consumer owns tail
+
+    The consumer creates the segment and removes it on close, like a Unix socket's receiver.
+    """
+
+    def __init__(self, name, capacity=1024, slot_size=256, create=True):
+        self.path = os.path.join("/dev/shm", name)
+        self.doorbell_path = self.path + ".doorbell"
+
+        size = SLOTS_OFFSET + capacity * slot_size
+        fd = os.open(self.path, os.O_RDWR | (os.O_CREAT if create else 0), 0o600)
+        try:
+            if create and os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            stat = os.fstat(fd)
+            if stat.st_size < SLOTS_OFFSET:
+                raise FileNotFoundError(f"{self.path} is not set up yet")
+            self.inode = stat.st_ino
+            self.map = mmap.mmap(fd, stat.st_size)
+        finally:
+            os.close(fd)
+
+        if not create:
+            # Attaching to a consumer's segment; don't take over one it hasn't initialized
+            if self.map[:8] != RING_MAGIC:
+                self.map.close()
+                raise FileNotFoundError(f"{self.path} is not set up yet")
+            _, self.capacity, self.slot_size = struct.unpack_from("<8sII", self.map, 0)
+            return
+
+        if self.map[:8] != RING_MAGIC:
+            struct.pack_into("<8sII", self.map, 0, RING_MAGIC, capacity, slot_size)
+        _, self.capacity, self.slot_size = struct.unpack_from("<8sII", self.map, 0)
+
+        if not os.path.exists(self.doorbell_path):
+            try:
+                os.mkfifo(self.doorbell_path, 0o600)
+            except FileExistsError:
+                pass
+
+    def head(self):
+        return COUNTER.unpack_from(self.map, HEAD_OFFSET)[0]
+
+    def tail(self):
+        return COUNTER.unpack_from(self.map, TAIL_OFFSET)[0]
+
+    def slot_offset(self, index):
+        return SLOTS_OFFSET + (index % self.capacity) * self.slot_size
+
+    def is_current(self):
+        """False once the consumer has removed or replaced the segment this maps"""
+        try:
+            return os.stat(self.path).st_ino == self.inode
+        except FileNotFoundError:
+            return False
+
+    def close(self):
+        self.map.close()
+
+    def unlink(self):
+        for path in (self.path, self.doorbell_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+class SharedMemoryRingTransport:
+    """Sender side of the shm ring; safe to share between threads (the ring itself has one producer)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.ring = None
+        self.doorbell = None
+        self.dropped = 0
+        self.sends = 0
+        # The recognizer sends from its processing and majority threads
+        self.lock = threading.Lock()
+        self.attach()
+
+    def attach(self):
+        """Map the consumer's current segment; returns False if no consumer has one"""
+        if self.ring is not None:
+            return True
+        try:
+            self.ring = SharedMemoryRing(self.name, create=False)
+        except (FileNotFoundError, ValueError):
+            return False
+        return True
+
+    def detach(self):
+        if self.doorbell is not None:
+            os.close(self.doorbell)
+            self.doorbell = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def ring_doorbell(self):
+        """Wake the consumer; returns False if the FIFO has lost its reader"""
+        if self.doorbell is None:
+            try:
+                self.doorbell = os.open(self.ring.doorbell_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                # The consumer hasn't opened the FIFO yet; it polls the ring when it does
+                return True
+        try:
+            os.write(self.doorbell, b"\x01")
+        except BlockingIOError:
+            # FIFO already full of wake-ups, the consumer is awake anyway
+            pass
+        except BrokenPipeError:
+            os.close(self.doorbell)
+            self.doorbell = None
+            return False
+        return True
+
+    def send(self, payload):
+        with self.lock:
+            self.sends += 1
+            if self.ring is not None and self.sends % SEGMENT_CHECK_INTERVAL == 0 and not self.ring.is_current():
+                self.detach()
+            sent = self.publish(payload)
+            if sent is None:
+                # The consumer went away or restarted; try its new segment once
+                self.detach()
+                sent = self.publish(payload)
+            if not sent:
+                self.dropped += 1
+            return bool(sent)
+
+    def publish(self, payload):
+        """Write one message; True if sent, False if dropped, None if the segment is stale"""
+        if not self.attach():
+            # Nobody listening
+            return False
+        ring = self.ring
+        if len(payload) > ring.slot_size - LENGTH.size:
+            return False
+        head = ring.head()
+        tail = ring.tail()
+        if head - tail >= ring.capacity:
+            # A full ring is also what a consumer that went away looks like
+            return None if not ring.is_current() else False
+
+        offset = ring.slot_offset(head)
+        LENGTH.pack_into(ring.map, offset, len(payload))
+        ring.map[offset + LENGTH.size:offset + LENGTH.size + len(payload)] = payload
+        # Publish the slot only after its contents are written (stores are not reordered on x86)
+        COUNTER.pack_into(ring.map, HEAD_OFFSET, head + 1)
+
+        # The consumer only sleeps once it has drained the ring, so only wake it if it had
+        # caught up with everything before this message. Re-reading tail after publishing
+        # closes the window where it drains and goes to sleep between our two reads; the
+        # receiver's recv timeout bounds the damage if a wake-up is ever missed anyway.
+        if ring.tail() >= head and not self.ring_doorbell() and not ring.is_current():
+            return None
+        return True
+
+    def close(self):
+        with self.lock:
+            self.detach()
+
+
+class SharedMemoryRingReceiver:
+    def __init__(self, name, capacity=1024, slot_size=256):
+        self.ring = SharedMemoryRing(name, capacity, slot_size)
+        # Start from whatever the producer has published, dropping stale messages
+        COUNTER.pack_into(self.ring.map, TAIL_OFFSET, self.ring.head())
+        self.doorbell = os.open(self.ring.doorbell_path, os.O_RDONLY | os.O_NONBLOCK)
+        # Holding a write end ourselves stops select() reporting EOF while no producer is attached
+        self.doorbell_keepalive = os.open(self.ring.doorbell_path, os.O_WRONLY | os.O_NONBLOCK)
+
+    def poll(self):
+        """Return the next payload without waiting, or None if the ring is empty"""
+        ring = self.ring
+        tail = ring.tail()
+        if tail == ring.head():
+            return None
+        offset = ring.slot_offset(tail)
+        length = LENGTH.unpack_from(ring.map, offset)[0]
+        payload = ring.map[offset + LENGTH.size:offset + LENGTH.size + length]
+        COUNTER.pack_into(ring.map, TAIL_OFFSET, tail + 1)
+        return payload
+
+    def recv(self, timeout=None):
+        payload = self.poll()
+        if payload is not None:
+            return payload
+        readable, _, _ = select.select([self.doorbell], [], [], timeout)
+        if readable:
+            try:
+                os.read(self.doorbell, 4096)
+            except BlockingIOError:
+                pass
+        return self.poll()
+
+    def close(self):
+        os.close(self.doorbell)
+        os.close(self.doorbell_keepalive)
+        self.ring.close()
+        self.ring.unlink()
+
+
+def _parse(url):
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == "udp":
+        return parsed.scheme, (parsed.hostname or "127.0.0.1", parsed.port or 5005)
+    if parsed.scheme == "unix":
+        return parsed.scheme, (parsed.path,)
+    if parsed.scheme == "shm":
+        if platform.machine().lower() not in X86_MACHINES:
+            raise ValueError(f"shm:// needs an x86 CPU (its ring relies on x86 store ordering); "
+                             f"use unix:// on {platform.machine()}")
+        return parsed.scheme, (parsed.netloc or parsed.path.lstrip("/"),)
+    raise ValueError(f"Unknown transport '{url}' (use udp://, unix:// or shm://)")
+
+
+def create_transport(url=DEFAULT_TRANSPORT):
+    """Create a sender for a transport URL"""
+    scheme, args = _parse(url)
+    if scheme == "udp":
+        return UDPTransport(*args)
+    if scheme == "unix":
+        return UnixDatagramTransport(*args)
+    return SharedMemoryRingTransport(*args)
+
+
+def create_receiver(url=DEFAULT_TRANSPORT):
+    """Create a receiver for a transport URL"""
+    scheme, args = _parse(url)
+    if scheme == "udp":
+        return UDPReceiver(*args)
+    if scheme == "unix":
+        return UnixDatagramReceiver(*args)
+    return SharedMemoryRingReceiver(*args)
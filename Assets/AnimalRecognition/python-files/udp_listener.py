@@ -2,7 +2,9 @@
 import socket
 import json
 import logging
+import argparse
 from datetime import datetime
+from transports import create_receiver
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -50,5 +52,29 @@ def start_udp_listener(host='127.0.0.1', port=5005):
     finally:
         sock.close()
 
+def start_transport_listener(url):
+    """Print every message received over a result transport (udp://, unix:// or shm://)"""
+    receiver = create_receiver(url)
+    logger.info(f"Listening on {url}")
+    logger.info("Press Ctrl+C to stop")
+    try:
+        while True:
+            payload = receiver.recv(timeout=1.0)
+            if payload is None:
+                continue
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            logger.info(f"[{timestamp}] Received: {bytes(payload).decode('utf-8', errors='replace')}")
+    except KeyboardInterrupt:
+        logger.info("Listener stopped by user")
+    finally:
+        receiver.close()
+
 if __name__ == "__main__":
-    start_udp_listener() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Print recognition results for testing")
+    parser.add_argument("--transport", default=None,
+                        help="Receive raw messages from a transport URL (e.g. unix:///tmp/animorphosis.sock, shm://animorphosis) instead of JSON over UDP")
+    args = parser.parse_args()
+    if args.transport:
+        start_transport_listener(args.transport)
+    else:
+        start_udp_listener() 
\ No newline at end of file
@@ -4,18 +4,31 @@ import websockets
 import json
 import socket
 import logging
+import argparse
+import os
 from datetime import datetime
+from profiler import NullProfiler, add_profile_arguments, create_profiler
+from transports import create_transport
+from event_journal import FORWARDED, NullJournal, create_journal, gateway_event, new_session_id
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Optional local transport (unix:///path.sock or shm://name) used instead of UDP to target_host:target_port
+RESULT_TRANSPORT = os.getenv("RESULT_TRANSPORT", "")
+# Append-only journal of forwarded detections (empty = disabled)
+EVENT_JOURNAL_DIR = os.getenv("EVENT_JOURNAL_DIR", "")
+
 class UDPProxy:
     def __init__(self):
         self.udp_socket = None
         self.target_host = "127.0.0.1"
         self.target_port = 5005
+        self.transport = None
         self.clients = set()
+        # Set by the unified runtime to hand messages to an in-process queue instead
+        self.deliver = None
         
     def setup_udp_socket(self):
         """Create UDP socket for sending messages"""
@@ -35,8 +48,20 @@ class UDPProxy:
             message_str = json.dumps(message)
             message_bytes = message_str.encode('utf-8')
             
+            if self.deliver:
+                return self.deliver(message_bytes)
+            
+            if RESULT_TRANSPORT:
+                if not self.transport:
+                    self.transport = create_transport(RESULT_TRANSPORT)
+                with profiler.stage("transport_send"):
+                    sent = self.transport.send(message_bytes)
+                logger.info(f"Message {'sent' if sent else 'dropped'} via {RESULT_TRANSPORT}: {message}")
+                return sent
+            
             # Send via UDP
-            self.udp_socket.sendto(message_bytes, (self.target_host, self.target_port))
+            with profiler.stage("udp_send"):
+                self.udp_socket.sendto(message_bytes, (self.target_host, self.target_port))
             logger.info(f"UDP message sent to {self.target_host}:{self.target_port}: {message_str}")
             return True
         except Exception as e:
@@ -46,16 +71,27 @@ class UDPProxy:
 # Global UDP proxy instance
 udp_proxy = UDPProxy()
 
+# Replaced by a sampling profiler when started with --profile
+profiler = NullProfiler()
+
+# Replaced by a journal writer on startup when EVENT_JOURNAL_DIR is set
+journal = NullJournal()
+
 async def handle_websocket(websocket, path):
     """Handle WebSocket connections"""
     client_id = id(websocket)
+    # Each connection is journaled as its own session unless the client names one
+    session = new_session_id()
     udp_proxy.clients.add(websocket)
     logger.info(f"Client {client_id} connected. Total clients: {len(udp_proxy.clients)}")
     
     try:
         async for message in websocket:
             try:
-                data = json.loads(message)
+                # Only synchronous sections are tagged; a stage held across an await
+                # would be attributed to whichever coroutine runs next
+                with profiler.stage("parse"):
+                    data = json.loads(message)
                 logger.info(f"Received from client {client_id}: {data}")
                 
                 if data.get('type') == 'config':
@@ -74,6 +110,11 @@ async def handle_websocket(websocket, path):
                 elif data.get('type') == 'udp_message':
                     # Forward message to UDP
                     success = udp_proxy.send_udp_message(data)
+                    label, confidence, latency, client_session = gateway_event(data)
+                    # Like udp_server, only messages naming an animal count as detections
+                    if success and label:
+                        journal.append(label, confidence, FORWARDED, latency,
+                                       session if client_session is None else client_session)
                     
                     # Send confirmation back to client
                     response = {
@@ -118,9 +159,21 @@ async def main():
         await asyncio.Future()  # Run forever
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket to UDP proxy")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = create_profiler(args)
+    profiler.start()
+    journal = create_journal(EVENT_JOURNAL_DIR, "udp_proxy")
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     except Exception as e:
-        logger.error(f"Server error: {e}") 
\ No newline at end of file
+        logger.error(f"Server error: {e}")
+    finally:
+        journal.close()
+        profiler.stop()
+        profiler.write_report(args.profile_output, args.profile_top)
+ 
\ No newline at end of file
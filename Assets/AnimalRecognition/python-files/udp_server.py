@@ -5,17 +5,30 @@ import json
 import socket
 import logging
 import urllib.parse
+import argparse
+import os
 from datetime import datetime
+from profiler import NullProfiler, add_profile_arguments, create_profiler
+from transports import create_transport
+from event_journal import FORWARDED, NullJournal, create_journal, gateway_event
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Optional local transport (unix:///path.sock or shm://name) used instead of UDP to target_host:target_port
+RESULT_TRANSPORT = os.getenv("RESULT_TRANSPORT", "")
+# Append-only journal of forwarded detections (empty = disabled)
+EVENT_JOURNAL_DIR = os.getenv("EVENT_JOURNAL_DIR", "")
+
 class UDPForwarder:
     def __init__(self):
         self.udp_socket = None
         self.target_host = "127.0.0.1"
         self.target_port = 5005
+        self.transport = None
+        # Set by the unified runtime to hand messages to an in-process queue instead
+        self.deliver = None
         
     def setup_udp_socket(self):
         """Create UDP socket for sending messages"""
@@ -34,8 +47,20 @@ class UDPForwarder:
             # Encode the string message for UDP
             message_bytes = str(message).encode('utf-8')
             
+            if self.deliver:
+                return self.deliver(message_bytes)
+            
+            if RESULT_TRANSPORT:
+                if not self.transport:
+                    self.transport = create_transport(RESULT_TRANSPORT)
+                with profiler.stage("transport_send"):
+                    sent = self.transport.send(message_bytes)
+                logger.info(f"Message {'sent' if sent else 'dropped'} via {RESULT_TRANSPORT}: {message}")
+                return sent
+            
             # Send via UDP
-            self.udp_socket.sendto(message_bytes, (self.target_host, self.target_port))
+            with profiler.stage("udp_send"):
+                self.udp_socket.sendto(message_bytes, (self.target_host, self.target_port))
             logger.info(f"UDP message sent to {self.target_host}:{self.target_port}: {message}")
             return True
         except Exception as e:
@@ -45,7 +70,56 @@ class UDPForwarder:
 # Global UDP forwarder instance
 udp_forwarder = UDPForwarder()
 
+# Replaced by a sampling profiler when started with --profile
+profiler = NullProfiler()
+
+# Replaced by a journal writer on startup when EVENT_JOURNAL_DIR is set
+journal = NullJournal()
+
+def handle_udp_request(data, unknown_type_message='Unknown message type'):
+    """Handle a /udp request body (GET query or POST JSON) and return the response dict"""
+    # Handle different message types
+    if data.get('type') == 'config':
+        # Update UDP target configuration
+        udp_forwarder.target_host = data.get('host', '127.0.0.1')
+        udp_forwarder.target_port = int(data.get('port', 8888))
+        logger.info(f"UDP target updated to {udp_forwarder.target_host}:{udp_forwarder.target_port}")
+        
+        return {
+            'status': 'success',
+            'message': f'UDP target set to {udp_forwarder.target_host}:{udp_forwarder.target_port}'
+        }
+        
+    elif data.get('type') == 'udp_message':
+        # Forward animal string to UDP
+        animal = data.get('animal')
+        if animal:
+            success = udp_forwarder.send_udp_message(animal)
+            message = 'UDP message sent'
+            if success:
+                label, confidence, latency, session = gateway_event(data)
+                journal.append(label, confidence, FORWARDED, latency, session)
+        else:
+            success = False
+            message = "Failed to send UDP message: 'animal' not provided"
+
+        return {
+            'status': 'success' if success else 'error',
+            'message': message,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+    else:
+        return {
+            'status': 'error',
+            'message': unknown_type_message
+        }
+
 class UDPHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    def handle_one_request(self):
+        with profiler.stage("request"):
+            super().handle_one_request()
+
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
@@ -65,39 +139,7 @@ class UDPHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 data = {k: v[0] for k, v in query_components.items()}
                 logger.info(f"Received GET request with data: {data}")
                 
-                # Handle different message types
-                if data.get('type') == 'config':
-                    # Update UDP target configuration
-                    udp_forwarder.target_host = data.get('host', '127.0.0.1')
-                    udp_forwarder.target_port = int(data.get('port', 8888))
-                    logger.info(f"UDP target updated to {udp_forwarder.target_host}:{udp_forwarder.target_port}")
-                    
-                    response = {
-                        'status': 'success',
-                        'message': f'UDP target set to {udp_forwarder.target_host}:{udp_forwarder.target_port}'
-                    }
-                    
-                elif data.get('type') == 'udp_message':
-                    # Forward animal string to UDP
-                    animal = data.get('animal')
-                    if animal:
-                        success = udp_forwarder.send_udp_message(animal)
-                        message = 'UDP message sent'
-                    else:
-                        success = False
-                        message = "Failed to send UDP message: 'animal' not provided"
-
-                    response = {
-                        'status': 'success' if success else 'error',
-                        'message': message,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    
-                else:
-                    response = {
-                        'status': 'error',
-                        'message': 'Unknown or missing message type in query string'
-                    }
+                response = handle_udp_request(data, 'Unknown or missing message type in query string')
                 
                 # Send response
                 self.send_response(200)
@@ -130,40 +172,7 @@ class UDPHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 data = json.loads(post_data.decode('utf-8'))
                 logger.info(f"Received POST data: {data}")
                 
-                # Handle different message types
-                if data.get('type') == 'config':
-                    # Update UDP target configuration
-                    udp_forwarder.target_host = data.get('host', '127.0.0.1')
-                    udp_forwarder.target_port = data.get('port', 8888)
-                    logger.info(f"UDP target updated to {udp_forwarder.target_host}:{udp_forwarder.target_port}")
-                    
-                    # Send success response
-                    response = {
-                        'status': 'success',
-                        'message': f'UDP target set to {udp_forwarder.target_host}:{udp_forwarder.target_port}'
-                    }
-                    
-                elif data.get('type') == 'udp_message':
-                    # Forward animal string to UDP
-                    animal = data.get('animal')
-                    if animal:
-                        success = udp_forwarder.send_udp_message(animal)
-                        message = 'UDP message sent'
-                    else:
-                        success = False
-                        message = "Failed to send UDP message: 'animal' not provided"
-
-                    response = {
-                        'status': 'success' if success else 'error',
-                        'message': message,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    
-                else:
-                    response = {
-                        'status': 'error',
-                        'message': 'Unknown message type'
-                    }
+                response = handle_udp_request(data)
                 
                 # Send response
                 self.send_response(200)
@@ -187,31 +196,44 @@ class UDPHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
 if __name__ == "__main__":
     PORT = 8005
     MAX_PORT_ATTEMPTS = 10  # Try up to 10 different ports
+
+    parser = argparse.ArgumentParser(description="HTTP to UDP forwarding server")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = create_profiler(args)
+    profiler.start()
+    journal = create_journal(EVENT_JOURNAL_DIR, "udp_server")
     
     # Change to the directory containing the files
-    import os
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
-    # Try to find an available port
-    for port_attempt in range(MAX_PORT_ATTEMPTS):
-        current_port = PORT + port_attempt
-        try:
-            with socketserver.TCPServer(("", current_port), UDPHTTPRequestHandler) as httpd:
-                print(f"UDP HTTP server running at http://localhost:{current_port}")
-                print("This server forwards HTTP POST or GET requests to UDP")
-                print("POST to /udp with JSON data to send UDP messages")
-                print("GET from /udp with URL parameters to send UDP messages")
-                print("Press Ctrl+C to stop the server")
-                httpd.serve_forever()
-                break  # Successfully started server, exit the loop
-        except OSError as e:
-            if e.errno == 48:  # Address already in use
-                print(f"Port {current_port} is already in use, trying next port...")
-                if port_attempt == MAX_PORT_ATTEMPTS - 1:
-                    print(f"Error: Could not find an available port after {MAX_PORT_ATTEMPTS} attempts")
-                    print("Please check if another instance is running or manually specify a port")
-                    exit(1)
-                continue
-            else:
-                # Re-raise other OSErrors
-                raise 
\ No newline at end of file
+    try:
+        # Try to find an available port
+        for port_attempt in range(MAX_PORT_ATTEMPTS):
+            current_port = PORT + port_attempt
+            try:
+                with socketserver.TCPServer(("", current_port), UDPHTTPRequestHandler) as httpd:
+                    print(f"UDP HTTP server running at http://localhost:{current_port}")
+                    print("This server forwards HTTP POST or GET requests to UDP")
+                    print("POST to /udp with JSON data to send UDP messages")
+                    print("GET from /udp with URL parameters to send UDP messages")
+                    print("Press Ctrl+C to stop the server")
+                    httpd.serve_forever()
+                    break  # Successfully started server, exit the loop
+            except OSError as e:
+                if e.errno == 48:  # Address already in use
+                    print(f"Port {current_port} is already in use, trying next port...")
+                    if port_attempt == MAX_PORT_ATTEMPTS - 1:
+                        print(f"Error: Could not find an available port after {MAX_PORT_ATTEMPTS} attempts")
+                        print("Please check if another instance is running or manually specify a port")
+                        exit(1)
+                    continue
+                else:
+                    # Re-raise other OSErrors
+                    raise
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        journal.close()
+        profiler.stop()
+        profiler.write_report(args.profile_output, args.profile_top)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Single-process runtime hosting the recognizer, the HTTP gateway and the WebSocket proxy.
+
+All roles share one asyncio event loop. Results from every role go into one in-process
+queue and a single delivery task forwards them to the game over the result transport
+(UDP to Unity by default), so there are no loopback hops between our own processes.
+The recognizer keeps its capture callback and worker threads; its results are handed to
+the loop with call_soon_threadsafe.
+
+Roles are enabled in a JSON config file (or with --roles):
+
+    {
+        "roles": ["recognizer", "http", "websocket"],
+        "host": "localhost",
+        "http_port": 8005,
+        "websocket_port": 8004,
+        "result_transport": "udp://127.0.0.1:5005",
+        "document_root": "."
+    }
+
+Besides /udp, the HTTP role serves index.html and the model files from document_root
+(relative to this directory), as udp_server.py does.
+
+    python unified_runtime.py --config unified.json
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import mimetypes
+import os
+import sys
+import threading
+import urllib.parse
+
+from hot_reload import load_config_file
+from event_journal import create_journal
+from profiler import add_profile_arguments, create_profiler
+from transports import create_transport
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ALL_ROLES = ("recognizer", "http", "websocket")
+DEFAULT_CONFIG = {
+    "roles": list(ALL_ROLES),
+    "host": "localhost",
+    "http_port": 8005,
+    "websocket_port": 8004,
+    "result_transport": "udp://127.0.0.1:5005",
+    "queue_size": 1024,
+    "document_root": ".",
+}
+
+
+class ResultBridge:
+    """In-process result queue; usable as a transport from any thread"""
+
+    def __init__(self, loop, maxsize=1024):
+        self.loop = loop
+        self.loop_thread = threading.get_ident()
+        self.queue = asyncio.Queue(maxsize)
+        self.delivered = 0
+        self.dropped = 0
+
+    def send(self, payload):
+        """Queue a payload for delivery; safe to call from worker threads"""
+        if threading.get_ident() == self.loop_thread:
+            self._put(payload)
+        else:
+            self.loop.call_soon_threadsafe(self._put, payload)
+        return True
+
+    def _put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Result queue full, dropped: {payload!r}")
+
+    def close(self):
+        # The recognizer closes its transport on shutdown; the bridge lives as long as the loop
+        pass
+
+    async def deliver(self, transport):
+        """Forward queued results to the game"""
+        while True:
+            payload = await self.queue.get()
+            if transport.send(payload):
+                self.delivered += 1
+            else:
+                self.dropped += 1
+
+
+# ---- Recognizer role ----
+def load_recognizer_module():
+    """Import animal-recognizer.py (its file name isn't a valid module name)"""
+    spec = importlib.util.spec_from_file_location("animal_recognizer", os.path.join(SCRIPT_DIR, "animal-recognizer.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def run_recognizer(bridge, profiler):
+    module = load_recognizer_module()
+    server = module.AudioRecognitionServer(profiler=profiler)
+    server.transport.close()
+    server.transport = bridge
+
+    if server.interpreter is None:
+        raise RuntimeError(f"Model not loaded from {module.MODEL_PATH}")
+
+    # start_server blocks on the audio stream, so it gets its own thread
+    thread = threading.Thread(target=server.start_server, name="recognizer")
+    thread.daemon = True
+    thread.start()
+    loop = asyncio.get_running_loop()
+    try:
+        # start_server only returns once the stream has stopped or failed to open
+        await loop.run_in_executor(None, thread.join)
+        raise RuntimeError("Recognizer stopped (audio stream closed or failed)")
+    finally:
+        server.is_running = False
+        await loop.run_in_executor(None, thread.join, 5.0)
+
+
+# ---- HTTP gateway role ----
+CORS_HEADERS = (
+    "Access-Control-Allow-Origin: *\r\n"
+    "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+    "Access-Control-Allow-Headers: Content-Type\r\n"
+)
+
+
+async def write_http_response(writer, status, body=b"", content_type="application/json"):
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+              500: "Internal Server Error"}[status]
+    head = (f"HTTP/1.1 {status} {reason}\r\n{CORS_HEADERS}"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def read_static_file(document_root, path):
+    """Return (body, content type) for a file under document_root, or None"""
+    relative = urllib.parse.unquote(path).lstrip("/") or "index.html"
+    file_path = os.path.realpath(os.path.join(document_root, relative))
+    if os.path.isdir(file_path):
+        file_path = os.path.join(file_path, "index.html")
+    # Refuse anything that resolves outside the document root
+    if os.path.commonpath([document_root, file_path]) != document_root or not os.path.isfile(file_path):
+        return None
+    with open(file_path, "rb") as f:
+        body = f.read()
+    return body, mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+
+
+async def handle_http(reader, writer, udp_server, document_root):
+    """Minimal HTTP/1.1 handler for the /udp endpoint of udp_server.py and its static files"""
+    try:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+        parsed = urllib.parse.urlparse(target)
+        if parsed.path != "/udp":
+            if method != "GET":
+                await write_http_response(writer, 405, b'{"status": "error", "message": "Method not allowed"}')
+                return
+            loop = asyncio.get_running_loop()
+            static = await loop.run_in_executor(None, read_static_file, document_root, parsed.path)
+            if static is None:
+                await write_http_response(writer, 404, b'{"status": "error", "message": "Not found"}')
+            else:
+                await write_http_response(writer, 200, *static)
+            return
+        if method == "OPTIONS":
+            await write_http_response(writer, 200)
+            return
+
+        try:
+            if method == "GET":
+                data = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+                response = udp_server.handle_udp_request(data, "Unknown or missing message type in query string")
+            elif method == "POST":
+                response = udp_server.handle_udp_request(json.loads(body.decode("utf-8")))
+            else:
+                await write_http_response(writer, 405, b'{"status": "error", "message": "Method not allowed"}')
+                return
+            await write_http_response(writer, 200, json.dumps(response).encode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            message = json.dumps({"status": "error", "message": f"Invalid JSON: {e}"})
+            await write_http_response(writer, 400, message.encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Error handling {method} request: {e}")
+            await write_http_response(writer, 500, json.dumps({"status": "error", "message": str(e)}).encode("utf-8"))
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+        logger.warning(f"Bad HTTP request: {e}")
+    finally:
+        writer.close()
+
+
+async def run_http_gateway(bridge, host, port, document_root):
+    import udp_server
+    udp_server.udp_forwarder.deliver = bridge.send
+    udp_server.journal = create_journal(udp_server.EVENT_JOURNAL_DIR, "udp_server")
+    document_root = os.path.realpath(os.path.join(SCRIPT_DIR, document_root))
+    server = await asyncio.start_server(lambda r, w: handle_http(r, w, udp_server, document_root), host, port)
+    logger.info(f"HTTP gateway running at http://{host}:{port}/udp, serving files from {document_root}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        udp_server.journal.close()
+
+
+# ---- WebSocket proxy role ----
+async def run_websocket_proxy(bridge, host, port):
+    import websockets
+    import udp_proxy
+    udp_proxy.udp_proxy.deliver = bridge.send
+    udp_proxy.journal = create_journal(udp_proxy.EVENT_JOURNAL_DIR, "udp_proxy")
+    try:
+        async with websockets.serve(udp_proxy.handle_websocket, host, port):
+            logger.info(f"WebSocket proxy running on ws://{host}:{port}")
+            await asyncio.Future()
+    finally:
+        udp_proxy.journal.close()
+
+
+async def run(config, profiler):
+    loop = asyncio.get_running_loop()
+    bridge = ResultBridge(loop, config["queue_size"])
+    transport = create_transport(config["result_transport"])
+    logger.info(f"Roles: {', '.join(config['roles'])}; results go to {config['result_transport']}")
+
+    tasks = [asyncio.create_task(bridge.deliver(transport), name="deliver")]
+    if "recognizer" in config["roles"]:
+        tasks.append(asyncio.create_task(run_recognizer(bridge, profiler), name="recognizer"))
+    if "http" in config["roles"]:
+        tasks.append(asyncio.create_task(run_http_gateway(bridge, config["host"], config["http_port"],
+                                                          config["document_root"]), name="http"))
+    if "websocket" in config["roles"]:
+        tasks.append(asyncio.create_task(run_websocket_proxy(bridge, config["host"], config["websocket_port"]),
+                                         name="websocket"))
+
+    failed = False
+    try:
+        # Any role failing brings the runtime down rather than leaving it half-running
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception():
+                failed = True
+                logger.error(f"Role '{task.get_name()}' failed: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        transport.close()
+        logger.info(f"Delivered {bridge.delivered} results, dropped {bridge.dropped}")
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run recognizer and gateways in one process")
+    parser.add_argument("--config", default="unified_config.json", help="JSON config file")
+    parser.add_argument("--roles", default=None, help=f"Comma separated roles to enable ({', '.join(ALL_ROLES)})")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG)
+    config.update(load_config_file(args.config))
+    if args.roles:
+        config["roles"] = [role.strip() for role in args.roles.split(",") if role.strip()]
+    unknown = set(config["roles"]) - set(ALL_ROLES)
+    if unknown:
+        parser.error(f"Unknown roles: {', '.join(sorted(unknown))}")
+
+    profiler = create_profiler(args)
+    profiler.start()
+    ok = True
+    try:
+        ok = asyncio.run(run(config, profiler))
+    except KeyboardInterrupt:
+        logger.info("Runtime stopped by user")
+    finally:
+        profiler.stop()
+        profiler.write_report(args.profile_output, args.profile_top)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()